@@ -0,0 +1,199 @@
+import argparse
+import os
+import string
+import sys
+import time
+
+ALPHABETS = {
+    'digits': string.digits,
+    'hex': string.hexdigits[:16],
+    'lower': string.ascii_lowercase,
+    'alnum': string.ascii_letters + string.digits,
+    'password': string.ascii_letters + string.digits + string.punctuation,
+}
+DEFAULT_ALPHABET = 'digits'
+DEFAULT_CODE_LENGTH = 6
+DEFAULT_BATCH_SIZE = 2 ** 16  # кодов в порции
+URANDOM_READ_SIZE = 2 ** 20  # байт os.urandom за одно обращение
+MAX_UNIQUE_SPACE = 2 ** 30  # кодов в пространстве для битовой карты уникальности (128 МБ)
+NUMBER_DIGITS = (string.digits + string.ascii_lowercase).encode()
+
+
+def get_alphabet(alphabet):
+    """Алфавит по имени из ALPHABETS или строка символов алфавита, возвращает bytes без повторов"""
+    symbols = ALPHABETS.get(alphabet, alphabet)
+    if not symbols.isascii():
+        raise ValueError('Алфавит должен состоять из символов ASCII')
+    symbols = symbols.encode()
+    if len(symbols) < 2 or len(set(symbols)) != len(symbols):
+        raise ValueError(f'Алфавит должен содержать не меньше двух различных символов: {alphabet!r}')
+
+    return symbols
+
+
+class RandomSymbols:
+    """Источник случайных символов алфавита из os.urandom без смещения распределения.
+    Байт b принимается, только если b < limit, где limit - наибольшее кратное размеру алфавита не больше 256,
+    и даёт символ alphabet[b % len(alphabet)]. Отбор и замена выполняются одним bytes.translate на весь
+    прочитанный блок, поэтому на символ не приходится ни одной операции интерпретатора"""
+
+    def __init__(self, alphabet, read_size=URANDOM_READ_SIZE):
+        self.alphabet = alphabet
+        self.read_size = read_size
+        limit = 256 - 256 % len(alphabet)
+        self.acceptance = limit / 256
+        self._table = bytes(alphabet[byte % len(alphabet)] if byte < limit else 0 for byte in range(256))
+        self._rejected = bytes(range(limit, 256))
+        self._buffer = b''
+
+    def read(self, count):
+        """Ровно count случайных символов"""
+        chunks = [self._buffer]
+        available = len(self._buffer)
+        while available < count:
+            # с запасом на отброшенные байты, чтобы обычно хватало одного обращения к os.urandom
+            read_size = max(self.read_size, int((count - available) / self.acceptance * 1.05) + 64)
+            chunk = os.urandom(read_size).translate(self._table, self._rejected)
+            chunks.append(chunk)
+            available += len(chunk)
+        symbols = b''.join(chunks)
+        self._buffer = symbols[count:]
+
+        return symbols[:count]
+
+
+class UniqueCodes:
+    """Отбор ещё не выданных кодов по битовой карте всего пространства кодов:
+    для PIN из 6 цифр это 10^6 бит (125 КБ). Номер кода - код как число в системе счисления размера алфавита"""
+
+    def __init__(self, alphabet, length):
+        if len(alphabet) > len(NUMBER_DIGITS):
+            raise ValueError(f'Уникальность поддерживается для алфавитов не больше {len(NUMBER_DIGITS)} символов')
+        self.base = len(alphabet)
+        self.space = self.base ** length
+        if self.space > MAX_UNIQUE_SPACE:
+            raise ValueError(f'Пространство кодов {self.space} слишком велико для битовой карты '
+                             f'(не больше {MAX_UNIQUE_SPACE})')
+        self._bitmap = bytearray((self.space + 7) // 8)
+        # символы алфавита переводятся в цифры 0-9a-z, чтобы номер кода считал int(code, base)
+        digits = NUMBER_DIGITS[:self.base]
+        self._digits_table = None if alphabet == digits else bytes.maketrans(alphabet, digits)
+
+    def filter(self, codes):
+        """Коды из codes, которые ещё не выдавались (повторы внутри codes тоже отбрасываются)"""
+        bitmap = self._bitmap
+        base = self.base
+        digits_table = self._digits_table
+        new_codes = []
+        for code in codes:
+            code_number = int(code if digits_table is None else code.translate(digits_table), base)
+            mask = 1 << (code_number & 7)
+            if not bitmap[code_number >> 3] & mask:
+                bitmap[code_number >> 3] |= mask
+                new_codes.append(code)
+
+        return new_codes
+
+
+def generate_codes(count, length=DEFAULT_CODE_LENGTH, alphabet=DEFAULT_ALPHABET, unique=False,
+                   batch_size=DEFAULT_BATCH_SIZE):
+    """Генератор порций (списков bytes) из count случайных кодов длины length в сумме.
+    alphabet - имя из ALPHABETS или строка символов; unique - без повторов (битовая карта, см. UniqueCodes)"""
+    alphabet = get_alphabet(alphabet)
+    random_symbols = RandomSymbols(alphabet)
+    unique_codes = None
+    if unique:
+        unique_codes = UniqueCodes(alphabet, length)
+        if count > unique_codes.space:
+            raise ValueError(f'Уникальных кодов длины {length} всего {unique_codes.space}, запрошено {count}')
+
+    while count > 0:
+        # при уникальности порция не уменьшается до остатка: под конец почти все коды отбрасываются как повторы
+        batch_count = batch_size if unique_codes is not None else min(batch_size, count)
+        symbols = random_symbols.read(batch_count * length)
+        codes = [symbols[start:start + length] for start in range(0, len(symbols), length)]
+        if unique_codes is not None:
+            codes = unique_codes.filter(codes)[:count]
+        count -= len(codes)
+        yield codes
+
+
+def write_codes(output_stream, count, length=DEFAULT_CODE_LENGTH, alphabet=DEFAULT_ALPHABET, unique=False,
+                batch_size=DEFAULT_BATCH_SIZE):
+    """Запись count кодов в бинарный поток по одному на строку, порциями, без накопления всех кодов в памяти"""
+    for codes in generate_codes(count, length, alphabet, unique, batch_size):
+        if codes:
+            output_stream.write(b'\n'.join(codes))
+            output_stream.write(b'\n')
+
+    return count
+
+
+if __name__ == '__main__':
+    command_line_parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Массовая генерация PIN-кодов и паролей из криптографически стойкого источника os.urandom',
+        epilog=f'''
+    Алфавиты: {", ".join(ALPHABETS)} (по умолчанию {DEFAULT_ALPHABET}) или строка символов алфавита.
+
+    Пример генерации миллиона уникальных PIN-кодов из 6 цифр в файл:
+    python passgen.py -n 1000000 -u -o pins.txt
+
+    Пример генерации 10 паролей длины 16:
+    python passgen.py -n 10 -l 16 -a password
+        '''
+    )
+    command_line_parser.add_argument('-n', '--count', type=int, default=1, help='Количество кодов (по умолчанию 1)')
+    command_line_parser.add_argument(
+        '-l',
+        '--length',
+        type=int,
+        default=DEFAULT_CODE_LENGTH,
+        help=f'Длина кода (по умолчанию {DEFAULT_CODE_LENGTH})',
+    )
+    command_line_parser.add_argument(
+        '-a',
+        '--alphabet',
+        type=str,
+        default=DEFAULT_ALPHABET,
+        help='Имя алфавита или строка его символов',
+    )
+    command_line_parser.add_argument(
+        '-u',
+        '--unique',
+        help='Без повторяющихся кодов (алфавит не больше 36 символов)',
+        action='store_true',
+    )
+    command_line_parser.add_argument('-o', '--output_file', type=str, help='Файл для кодов (по умолчанию консоль)')
+    command_line_parser.add_argument(
+        '-b',
+        '--batch_size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f'Кодов в порции (по умолчанию {DEFAULT_BATCH_SIZE})',
+    )
+    command_line_parser.add_argument(
+        '-v',
+        '--verbose',
+        help='Вывод времени и скорости генерации (в stderr)',
+        action='store_true',
+    )
+    arguments = command_line_parser.parse_args()
+    if arguments.count < 0 or arguments.length < 1 or arguments.batch_size < 1:
+        command_line_parser.error('количество, длина и размер порции должны быть положительными')
+
+    start_time = time.perf_counter()
+    try:
+        if arguments.output_file:
+            with open(arguments.output_file, 'wb') as codes_file:
+                write_codes(codes_file, arguments.count, arguments.length, arguments.alphabet, arguments.unique,
+                            arguments.batch_size)
+        else:
+            write_codes(sys.stdout.buffer, arguments.count, arguments.length, arguments.alphabet, arguments.unique,
+                        arguments.batch_size)
+    except ValueError as error:
+        command_line_parser.error(str(error))
+    elapsed = time.perf_counter() - start_time
+    if arguments.verbose:
+        print(f'Кодов: {arguments.count}, время: {elapsed:.3f} с, {arguments.count / elapsed:,.0f} кодов/с',
+              file=sys.stderr)
@@ -0,0 +1,355 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # модуля resource нет в Windows, пиковая память там не измеряется
+    resource = None
+
+import keygen
+import numpy_backend
+import rsacrypt
+import ursacrypt
+from keygen import VerbosePrint
+
+RESULTS_VERSION = 1
+SIZE_SUFFIXES = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30}
+MAX_INPUT_SIZE = 2 ** 30
+DEFAULT_SIZES = ('1K', '64K', '1M')
+FLAVORS = ('random', 'zero', 'text')
+CRYPT_TOOLS = ('rsacrypt', 'ursacrypt')
+TOOLS = (*CRYPT_TOOLS, 'keygen')
+DEFAULT_KEY_BITS = (16, 2048)
+DEFAULT_KEYGEN_BITS = (0, 1024, 2048)  # 0 - учебный ключ keygen.py без опции --bits
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.1  # допустимое падение скорости относительно базового замера (10%)
+GENERATION_CHUNK_SIZE = 2 ** 20
+TEXT_WORDS = (
+    'шифрование', 'ключ', 'блок', 'модуль', 'простое', 'число', 'открытый', 'закрытый', 'текст', 'файл',
+    'the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'RSA', '2048', '65537',
+)
+
+
+def parse_size(size):
+    """Перевод размера вида 1K, 64K, 1M, 1G (или числа байтов) в количество байтов"""
+    size = str(size).strip().upper()
+    multiplier = SIZE_SUFFIXES.get(size[-1:], 1)
+    value = int(size[:-1] if size[-1:] in SIZE_SUFFIXES else size) * multiplier
+    if not 0 < value <= MAX_INPUT_SIZE:
+        raise ValueError(f'Размер входных данных должен быть от 1 байта до {MAX_INPUT_SIZE} байт, получено {size}')
+    return value
+
+
+def generate_chunk(flavor, rng):
+    """Блок входных данных длиной GENERATION_CHUNK_SIZE байт: случайные байты, нули или текст из слов"""
+    if flavor == 'random':
+        return rng.getrandbits(8 * GENERATION_CHUNK_SIZE).to_bytes(GENERATION_CHUNK_SIZE, byteorder='big')
+    if flavor == 'zero':
+        return bytes(GENERATION_CHUNK_SIZE)
+    if flavor == 'text':
+        text = bytearray()
+        while len(text) < GENERATION_CHUNK_SIZE:
+            text += ' '.join(rng.choice(TEXT_WORDS) for _ in range(rng.randint(5, 15))).encode() + b'.\n'
+        return bytes(text[:GENERATION_CHUNK_SIZE])
+    raise ValueError(f'Неизвестный вид входных данных: {flavor}')
+
+
+def generate_input(path, size, flavor, seed=0):
+    """Запись входного файла заданного размера и вида. Файл пишется блоками, поэтому 1 ГБ не держится в памяти,
+    а содержимое при одном и том же зерне воспроизводимо"""
+    rng = random.Random(f'{seed}-{flavor}')
+    with open(path, 'wb') as input_file:
+        while size > 0:
+            chunk = generate_chunk(flavor, rng)[:size]
+            input_file.write(chunk)
+            size -= len(chunk)
+
+
+def get_peak_rss_kb():
+    """Пиковый размер резидентной памяти текущего процесса в КБ (None, если не поддерживается)"""
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss  # в macOS ru_maxrss в байтах
+
+
+def _run_keygen(work_dir, bits, seed):
+    os.chdir(work_dir)  # keygen.main пишет public.key и private.key в текущую директорию
+    keygen.main(seed, bits=bits or None)
+
+
+def _measure_in_process(function, args):
+    start_time = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start_time, get_peak_rss_kb()
+
+
+def measure(function, *args, repeats=DEFAULT_REPEATS):
+    """Замер function(*args): каждый запуск в отдельном новом процессе, чтобы пиковая память одного замера
+    не влияла на другой. Возвращает (лучшее время в секундах, наибольшую пиковую память в КБ)"""
+    timings = []
+    peak_rss_values = []
+    for _ in range(repeats):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            elapsed, peak_rss = executor.submit(_measure_in_process, function, args).result()
+        timings.append(elapsed)
+        peak_rss_values.append(peak_rss)
+
+    return min(timings), None if None in peak_rss_values else max(peak_rss_values)
+
+
+def get_block_bits(tool, key_base):
+    """Длина блока открытого текста в битах для скрипта tool (для ursacrypt - в упаковке по умолчанию для ключа)"""
+    if tool == 'rsacrypt':
+        return key_base.bit_length() - 1
+    return ursacrypt.get_block_geometry(key_base, ursacrypt.get_default_layout(key_base))[0]
+
+
+def benchmark_crypt(tool, input_path, work_dir, key_pair, key_bits, flavor, repeats):
+    """Замер шифрования и дешифрования файла input_path скриптом tool, возвращает два результата"""
+    module = rsacrypt if tool == 'rsacrypt' else ursacrypt
+    input_size = os.path.getsize(input_path)
+    encrypted_path = os.path.join(work_dir, f'{tool}.enc')
+    decrypted_path = os.path.join(work_dir, f'{tool}.dec')
+    private_key = (*key_pair['private_key'], *key_pair['crt_components'])
+    blocks_count = -(-8 * input_size // get_block_bits(tool, key_pair['public_key'][1]))
+    results = []
+    for mode, source_path, output_path, key in (
+            (module.ENCRYPT_MODE, input_path, encrypted_path, key_pair['public_key']),
+            (module.DECRYPT_MODE, encrypted_path, decrypted_path, private_key),
+    ):
+        seconds, peak_rss_kb = measure(module.crypt, source_path, mode, output_path, key, repeats=repeats)
+        results.append({
+            'name': f'{tool}/{mode}/{flavor}/{input_size}/{key_bits}',
+            'tool': tool,
+            'mode': mode,
+            'flavor': flavor,
+            'size': input_size,
+            'key_bits': key_bits,
+            'seconds': seconds,
+            'mb_per_s': input_size / 2 ** 20 / seconds,
+            'blocks_per_s': blocks_count / seconds,
+            'peak_rss_kb': peak_rss_kb,
+            'expansion_ratio': os.path.getsize(encrypted_path) / input_size,
+        })
+
+    os.remove(encrypted_path)
+    os.remove(decrypted_path)
+    return results
+
+
+def benchmark_keygen(work_dir, bits, repeats):
+    """Замер keygen.main для ключа длиной bits бит (0 - учебный ключ)"""
+    seconds, peak_rss_kb = measure(_run_keygen, work_dir, bits, 1, repeats=repeats)
+    return {
+        'name': f'keygen/{bits}',
+        'tool': 'keygen',
+        'key_bits': bits,
+        'seconds': seconds,
+        'keys_per_s': 1 / seconds,
+        'peak_rss_kb': peak_rss_kb,
+    }
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, flavors=FLAVORS, key_bits=DEFAULT_KEY_BITS, keygen_bits=DEFAULT_KEYGEN_BITS,
+                   tools=TOOLS, repeats=DEFAULT_REPEATS, work_dir=None, verbose=False):
+    """Запуск всех замеров, возвращает список результатов"""
+    verbose_print = VerbosePrint(verbose)
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as benchmark_dir:
+        crypt_tools = [tool for tool in tools if tool in CRYPT_TOOLS]
+        key_pairs = {bits: keygen.generate_key_pair(bits, random.Random(f'benchmark-{bits}')) for bits in key_bits}
+        for size in map(parse_size, sizes if crypt_tools else ()):
+            for flavor in flavors:
+                input_path = os.path.join(benchmark_dir, f'input_{flavor}_{size}.bin')
+                verbose_print(f'Генерация входного файла {flavor}, {size} байт')
+                generate_input(input_path, size, flavor)
+                for bits, key_pair in key_pairs.items():
+                    for tool in crypt_tools:
+                        tool_results = benchmark_crypt(tool, input_path, benchmark_dir, key_pair, bits, flavor, repeats)
+                        for result in tool_results:
+                            verbose_print(f'{result["name"]:<48}{result["mb_per_s"]:>12.3f} МБ/с')
+                        results.extend(tool_results)
+                os.remove(input_path)
+
+        if 'keygen' in tools:
+            for bits in keygen_bits:
+                result = benchmark_keygen(benchmark_dir, bits, repeats)
+                verbose_print(f'{result["name"]:<48}{result["keys_per_s"]:>12.3f} ключ/с')
+                results.append(result)
+
+    return results
+
+
+def get_environment():
+    """Описание окружения, в котором сделаны замеры"""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy_backend.numpy.__version__ if numpy_backend.numpy is not None else None,
+    }
+
+
+def save_results(path, results):
+    with open(path, 'w') as results_file:
+        json.dump(
+            {
+                'version': RESULTS_VERSION,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'environment': get_environment(),
+                'results': results,
+            },
+            results_file,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def load_results(path):
+    with open(path, 'r') as results_file:
+        report = json.load(results_file)
+
+    if report.get('version') != RESULTS_VERSION:
+        raise ValueError(f'Неподдерживаемая версия файла результатов {path}')
+    return report['results']
+
+
+def get_throughput(result):
+    return result['keys_per_s'] if result['tool'] == 'keygen' else result['mb_per_s']
+
+
+def compare_results(results, baseline_results, threshold=DEFAULT_THRESHOLD):
+    """Сравнение скорости с базовыми замерами по совпадающим именам.
+    Возвращает список (имя, базовая скорость, текущая скорость, отношение, признак регрессии)"""
+    baseline_by_name = {result['name']: result for result in baseline_results}
+    comparison = []
+    for result in results:
+        baseline_result = baseline_by_name.get(result['name'])
+        if baseline_result is None:
+            continue
+        baseline_throughput = get_throughput(baseline_result)
+        throughput = get_throughput(result)
+        ratio = throughput / baseline_throughput
+        comparison.append((result['name'], baseline_throughput, throughput, ratio, ratio < 1 - threshold))
+
+    return comparison
+
+
+def print_comparison(comparison):
+    print(f'{"замер":<48}{"база":>14}{"текущий":>14}{"отношение":>12}')
+    for name, baseline_throughput, throughput, ratio, is_regression in comparison:
+        mark = '  РЕГРЕССИЯ' if is_regression else ''
+        print(f'{name:<48}{baseline_throughput:>14.3f}{throughput:>14.3f}{ratio:>12.3f}{mark}')
+
+
+if __name__ == '__main__':
+    command_line_parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Замеры скорости rsacrypt, ursacrypt и keygen с сохранением результатов в JSON',
+        epilog='''
+    Скорость шифрования указывается в МБ открытого текста в секунду, для keygen - в ключах в секунду.
+    Каждый замер выполняется в отдельном процессе, берётся лучшее время из --repeats запусков.
+
+    Пример сохранения базового замера:
+    python benchmark.py -o baseline.json
+
+    Пример замера с сравнением с базовым (код возврата 1 при падении скорости больше чем на 10%):
+    python benchmark.py -o current.json -b baseline.json
+
+    Пример сравнения двух сохранённых файлов без замеров:
+    python benchmark.py -c current.json -b baseline.json
+
+    Пример замера ursacrypt на файле 1 ГБ:
+    python benchmark.py --tools ursacrypt --sizes 1G --flavors random --key_bits 16
+        '''
+    )
+    command_line_parser.add_argument(
+        '-o',
+        '--output_file',
+        type=str,
+        default='benchmark.json',
+        help='Путь до файла результатов (по умолчанию benchmark.json)',
+    )
+    command_line_parser.add_argument('-b', '--baseline', type=str, help='Путь до файла базовых результатов')
+    command_line_parser.add_argument(
+        '-c',
+        '--compare',
+        type=str,
+        help='Сравнить сохранённый файл результатов с базовым без запуска замеров',
+    )
+    command_line_parser.add_argument(
+        '-t',
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f'Допустимое падение скорости (по умолчанию {DEFAULT_THRESHOLD})',
+    )
+    command_line_parser.add_argument(
+        '--sizes',
+        nargs='+',
+        default=DEFAULT_SIZES,
+        help=f'Размеры входных файлов от 1K до 1G (по умолчанию {" ".join(DEFAULT_SIZES)})',
+    )
+    command_line_parser.add_argument(
+        '--flavors',
+        nargs='+',
+        choices=FLAVORS,
+        default=FLAVORS,
+        help='Виды входных данных',
+    )
+    command_line_parser.add_argument(
+        '--key_bits',
+        type=int,
+        nargs='+',
+        default=DEFAULT_KEY_BITS,
+        help='Длины модулей ключей шифрования в битах',
+    )
+    command_line_parser.add_argument(
+        '--keygen_bits',
+        type=int,
+        nargs='+',
+        default=DEFAULT_KEYGEN_BITS,
+        help='Длины ключей для замера keygen (0 - учебный ключ)',
+    )
+    command_line_parser.add_argument('--tools', nargs='+', choices=TOOLS, default=TOOLS, help='Замеряемые скрипты')
+    command_line_parser.add_argument(
+        '-r',
+        '--repeats',
+        type=int,
+        default=DEFAULT_REPEATS,
+        help=f'Количество запусков каждого замера (по умолчанию {DEFAULT_REPEATS})',
+    )
+    command_line_parser.add_argument('-w', '--work_dir', type=str, help='Директория для временных файлов')
+    command_line_parser.add_argument('-v', '--verbose', help='Вывод процесса в консоль', action='store_true')
+    arguments = command_line_parser.parse_args()
+    if arguments.compare:
+        benchmark_results = load_results(arguments.compare)
+    else:
+        benchmark_results = run_benchmarks(
+            arguments.sizes,
+            arguments.flavors,
+            arguments.key_bits,
+            arguments.keygen_bits,
+            arguments.tools,
+            arguments.repeats,
+            arguments.work_dir,
+            arguments.verbose,
+        )
+        save_results(arguments.output_file, benchmark_results)
+    if arguments.baseline:
+        results_comparison = compare_results(benchmark_results, load_results(arguments.baseline), arguments.threshold)
+        print_comparison(results_comparison)
+        if any(is_regression for *_, is_regression in results_comparison):
+            sys.exit(1)
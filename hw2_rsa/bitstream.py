@@ -0,0 +1,73 @@
+class BitReader:
+    """Чтение блоков по N бит из буфера байтов (старшие биты первыми) без построения двоичной строки"""
+
+    def __init__(self, data, bits_count=None):
+        self.data = memoryview(data).cast('B')
+        self.bits_count = len(self.data) * 8 if bits_count is None else bits_count
+        self.position = 0  # количество прочитанных бит
+        self._accumulator = 0
+        self._accumulator_bits = 0
+        self._byte_position = 0
+
+    @property
+    def remaining(self):
+        return self.bits_count - self.position
+
+    def read(self, bits_count):
+        """Чтение блока длиной bits_count бит, возвращает пару (значение, количество прочитанных бит).
+        В конце буфера блок может оказаться короче запрошенного, как срез строки '0'/'1'"""
+        bits_count = min(bits_count, self.remaining)
+        while self._accumulator_bits < bits_count:
+            chunk = self.data[self._byte_position:self._byte_position + 8]
+            self._accumulator = (self._accumulator << (8 * len(chunk))) | int.from_bytes(chunk, byteorder='big')
+            self._accumulator_bits += 8 * len(chunk)
+            self._byte_position += len(chunk)
+
+        self._accumulator_bits -= bits_count
+        value = self._accumulator >> self._accumulator_bits
+        self._accumulator &= (1 << self._accumulator_bits) - 1
+        self.position += bits_count
+        return value, bits_count
+
+
+class BitWriter:
+    """Запись блоков по N бит в буфер байтов (старшие биты первыми) без построения двоичной строки"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._accumulator = 0
+        self._accumulator_bits = 0
+
+    @property
+    def position(self):
+        """Количество записанных бит"""
+        return 8 * len(self._buffer) + self._accumulator_bits
+
+    def write(self, value, bits_count):
+        """Запись значения шириной bits_count бит.
+        Как и '{:0>Nb}'.format, значение, не помещающееся в bits_count бит, записывается целиком"""
+        if value >> bits_count:
+            bits_count = value.bit_length()
+
+        self._accumulator = (self._accumulator << bits_count) | value
+        self._accumulator_bits += bits_count
+        if self._accumulator_bits >= 64:
+            self._flush()
+
+    def _flush(self):
+        bytes_count = self._accumulator_bits // 8
+        if bytes_count:
+            self._accumulator_bits -= 8 * bytes_count
+            self._buffer += (self._accumulator >> self._accumulator_bits).to_bytes(bytes_count, byteorder='big')
+            self._accumulator &= (1 << self._accumulator_bits) - 1
+
+    def getvalue(self, pad_right=False):
+        """Получение записанных байтов. Неполный последний байт выравнивается по правому краю
+        (как int(window, base=2).to_bytes(1) для последнего короткого окна), а при pad_right дополняется нулями справа,
+        чтобы биты шли подряд до конца потока"""
+        self._flush()
+        if self._accumulator_bits:
+            last_byte = self._accumulator << (8 - self._accumulator_bits) if pad_right else self._accumulator
+            return bytes(self._buffer) + last_byte.to_bytes(1, byteorder='big')
+
+        return bytes(self._buffer)
@@ -0,0 +1,109 @@
+import functools
+import os
+import sys
+from array import array
+
+CODEBOOK_MAX_MODULUS = 2 ** 16  # модуль, при котором все значения блоков помещаются в таблицу из 2^16 элементов
+CODEBOOK_CACHE_DIR = 'codebooks'
+DEFAULT_BLOCK_CACHE_MEMORY = 64 * 2 ** 20  # байт памяти под кэш результатов блоков
+BLOCK_CACHE_ENTRY_OVERHEAD = 160  # байт на запись кэша сверх самих чисел: слот словаря и элемент списка LRU
+
+
+def build_codebook(key_var, key_base):
+    """Построение кодовой книги: таблицы значений (m ** key_var) % key_base для всех блоков m < key_base"""
+    if key_base > CODEBOOK_MAX_MODULUS:
+        raise ValueError(f'Кодовая книга доступна только для n <= {CODEBOOK_MAX_MODULUS}, получено n = {key_base}')
+
+    return array('H', (pow(block, key_var, key_base) for block in range(key_base)))
+
+
+def get_codebook_path(key_var, key_base, cache_dir=CODEBOOK_CACHE_DIR):
+    """Путь до файла кэша кодовой книги для ключа (key_var, key_base)"""
+    return os.path.join(cache_dir, f'{key_var}_{key_base}.cb')
+
+
+def load_codebook(key_var, key_base, cache_dir=CODEBOOK_CACHE_DIR):
+    """Загрузка кодовой книги из кэша на диске, при отсутствии кэша - построение и сохранение"""
+    codebook_path = get_codebook_path(key_var, key_base, cache_dir)
+    codebook = array('H')
+    if os.path.isfile(codebook_path) and os.path.getsize(codebook_path) == key_base * codebook.itemsize:
+        with open(codebook_path, 'rb') as codebook_file:
+            codebook.fromfile(codebook_file, key_base)
+        if sys.byteorder == 'big':  # кэш хранится в little-endian
+            codebook.byteswap()
+        return codebook
+
+    codebook = build_codebook(key_var, key_base)
+    os.makedirs(cache_dir, exist_ok=True)
+    stored_codebook = array('H', codebook)
+    if sys.byteorder == 'big':
+        stored_codebook.byteswap()
+    temporary_path = f'{codebook_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as codebook_file:
+        stored_codebook.tofile(codebook_file)
+    os.replace(temporary_path, codebook_path)  # атомарная замена, чтобы параллельные запуски не читали неполный файл
+    return codebook
+
+
+def get_crt_block_crypter(p, q, d_p, d_q, q_inv):
+    """Функция дешифрования блока по китайской теореме об остатках: два возведения в степень по модулям p и q
+    с половинными показателями вместо одного по модулю n"""
+    def crypt_block(block):
+        m_p = pow(block, d_p, p)
+        m_q = pow(block, d_q, q)
+        return m_q + (q_inv * (m_p - m_q) % p) * q
+
+    return crypt_block
+
+
+class BlockCache:
+    """LRU-кэш результатов преобразования блоков для модулей, слишком больших для кодовой книги: на данных
+    с повторяющимися блоками (нули, логи, дампы) возведение в степень выполняется один раз на значение блока.
+    Размер ограничен max_memory байт: число записей оценивается по длине n, давно не использованные вытесняются.
+    Статистика (hits, misses, hit_rate) относится к функции из последнего вызова wrap"""
+
+    def __init__(self, max_memory=DEFAULT_BLOCK_CACHE_MEMORY):
+        self.max_memory = max_memory
+        self.max_entries = 0
+        self._cached_crypt_block = None
+
+    def wrap(self, crypt_block, key_base):
+        """Функция преобразования блока с кэшем (functools.lru_cache) поверх crypt_block для модуля key_base"""
+        entry_size = 2 * sys.getsizeof(key_base) + BLOCK_CACHE_ENTRY_OVERHEAD  # блок и результат меньше key_base
+        self.max_entries = max(1, self.max_memory // entry_size)
+        self._cached_crypt_block = functools.lru_cache(maxsize=self.max_entries)(crypt_block)
+        return self._cached_crypt_block
+
+    @property
+    def hits(self):
+        return self._cached_crypt_block.cache_info().hits if self._cached_crypt_block else 0
+
+    @property
+    def misses(self):
+        return self._cached_crypt_block.cache_info().misses if self._cached_crypt_block else 0
+
+    @property
+    def entries(self):
+        return self._cached_crypt_block.cache_info().currsize if self._cached_crypt_block else 0
+
+    @property
+    def hit_rate(self):
+        hits = self.hits
+        return hits / (hits + self.misses or 1)
+
+    def report(self):
+        return (f'Кэш блоков: попаданий {self.hits}, промахов {self.misses} ({self.hit_rate:.1%} попаданий), '
+                f'записей {self.entries} из {self.max_entries}')
+
+
+def get_block_crypter(key_var, key_base, codebook=False, cache_dir=CODEBOOK_CACHE_DIR, crt_components=None):
+    """Получение функции преобразования блока: block -> (block ** key_var) % key_base.
+    crt_components - (p, q, dP, dQ, qInv) из расширенного приватного ключа, ускоряют дешифрование"""
+    if codebook:
+        table = load_codebook(key_var, key_base, cache_dir)
+        return lambda block: table[block % key_base]
+
+    if crt_components:
+        return get_crt_block_crypter(*crt_components)
+
+    return lambda block: pow(block, key_var, key_base)
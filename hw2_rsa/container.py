@@ -0,0 +1,119 @@
+import os
+import struct
+import zlib
+
+CONTAINER_SIGNATURE = b'uRSC'
+CONTAINER_VERSION = 1
+DEFAULT_CONTAINER_CHUNK_SIZE = 2 ** 16  # байтов открытого текста в порции
+
+# Заголовок: сигнатура, версия, флаги (зарезервированы), размер порции открытого текста.
+# Запись индекса: смещение порции в файле, длина зашифрованной порции, длина открытого текста, CRC32 шифротекста.
+# Окончание: смещение индекса, размер открытого текста, количество порций, CRC32 индекса, сигнатура.
+# Индекс пишется в конце, поэтому контейнер записывается потоком без знания размера входных данных
+CONTAINER_HEADER = struct.Struct('>4sBBHI')
+CONTAINER_INDEX_ENTRY = struct.Struct('>QIII')
+CONTAINER_FOOTER = struct.Struct('>QQII4s')
+
+
+def is_container(data):
+    """Проверка, является ли буфер (bytes, mmap) контейнером: сигнатура в заголовке и в окончании"""
+    if len(data) < CONTAINER_HEADER.size + CONTAINER_FOOTER.size:
+        return False
+
+    return data[:4] == CONTAINER_SIGNATURE and data[-4:] == CONTAINER_SIGNATURE
+
+
+def is_container_file(path):
+    """Проверка файла по сигнатурам без чтения всего файла"""
+    if os.path.getsize(path) < CONTAINER_HEADER.size + CONTAINER_FOOTER.size:
+        return False
+
+    with open(path, 'rb') as container_file:
+        header_signature = container_file.read(4)
+        container_file.seek(-4, os.SEEK_END)
+        return header_signature == CONTAINER_SIGNATURE and container_file.read(4) == CONTAINER_SIGNATURE
+
+
+class ContainerWriter:
+    """Запись контейнера из независимо дешифруемых порций в поток output_stream.
+    Порция - полный поток uRSA (блоки и длина последнего блока) для chunk_size байт открытого текста"""
+
+    def __init__(self, output_stream, chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE):
+        self.output_stream = output_stream
+        self.chunk_size = chunk_size
+        self.plaintext_size = 0
+        self._index = bytearray()
+        self.chunks_count = 0
+        self._offset = output_stream.write(CONTAINER_HEADER.pack(CONTAINER_SIGNATURE, CONTAINER_VERSION, 0, 0,
+                                                                 chunk_size))
+
+    def write_chunk(self, crypted_chunk, plaintext_size):
+        self._index += CONTAINER_INDEX_ENTRY.pack(
+            self._offset,
+            len(crypted_chunk),
+            plaintext_size,
+            zlib.crc32(crypted_chunk),
+        )
+        self.chunks_count += 1
+        self._offset += self.output_stream.write(crypted_chunk)
+        self.plaintext_size += plaintext_size
+
+    def close(self):
+        """Запись индекса и окончания контейнера"""
+        self.output_stream.write(self._index)
+        self.output_stream.write(CONTAINER_FOOTER.pack(
+            self._offset,
+            self.plaintext_size,
+            self.chunks_count,
+            zlib.crc32(self._index),
+            CONTAINER_SIGNATURE,
+        ))
+
+
+class ContainerReader:
+    """Чтение контейнера из буфера (bytes, mmap): заголовок, индекс и отдельные порции без чтения остальных.
+    Держит memoryview буфера, поэтому перед закрытием mmap читатель закрывается (close или with)"""
+
+    def __init__(self, data):
+        if not is_container(data):
+            raise ValueError('Файл не является контейнером uRSA')
+        self.data = memoryview(data)
+        _, version, _, _, self.chunk_size = CONTAINER_HEADER.unpack(self.data[:CONTAINER_HEADER.size])
+        if version != CONTAINER_VERSION:
+            self.close()
+            raise ValueError(f'Неподдерживаемая версия контейнера: {version}')
+
+        index_offset, self.plaintext_size, chunks_count, index_crc, _ = CONTAINER_FOOTER.unpack(
+            self.data[-CONTAINER_FOOTER.size:]
+        )
+        # срезы memoryview освобождаются сразу, иначе при исключении они не дадут закрыть mmap
+        with self.data[index_offset:index_offset + chunks_count * CONTAINER_INDEX_ENTRY.size] as index:
+            if len(index) != chunks_count * CONTAINER_INDEX_ENTRY.size or zlib.crc32(index) != index_crc:
+                self.close()
+                raise ValueError('Индекс контейнера повреждён')
+            self.index = list(CONTAINER_INDEX_ENTRY.iter_unpack(index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def get_chunk(self, chunk_number, verify=True):
+        """Зашифрованная порция с номером chunk_number (срез буфера без копирования) с проверкой CRC32"""
+        offset, crypted_size, _, crc = self.index[chunk_number]
+        crypted_chunk = self.data[offset:offset + crypted_size]
+        if verify and zlib.crc32(crypted_chunk) != crc:
+            crypted_chunk.release()
+            raise ValueError(f'Порция {chunk_number} контейнера повреждена: не совпадает CRC32')
+        return crypted_chunk
+
+    def get_chunk_range(self, start, end):
+        """Номера первой и последней порций, пересекающихся с байтами открытого текста [start, end)"""
+        return start // self.chunk_size, (end - 1) // self.chunk_size
+
+    def close(self):
+        self.data.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import itertools
+import socket
+
+from cryptservice import (DEFAULT_SOCKET_PATH, OPERATION_DECRYPT, OPERATION_ENCRYPT, OPERATION_PING, RESPONSE_HEADER,
+                          STATUS_OK, pack_request)
+
+REQUEST_ID_LIMIT = 2 ** 32
+
+
+class CryptServiceError(Exception):
+    """Ошибка, которую вернул сервис шифрования (неверные данные, нет ключа для операции и т.п.)"""
+
+
+def _receive_exactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('Сервис шифрования закрыл соединение')
+        data += chunk
+
+    return bytes(data)
+
+
+class CryptClient:
+    """Блокирующий клиент сервиса шифрования (cryptservice.py): один запрос за раз по одному соединению"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        self._connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._connection.connect(socket_path)
+        self._request_ids = itertools.count()
+
+    def request(self, operation, payload=b''):
+        request_id = next(self._request_ids) % REQUEST_ID_LIMIT
+        self._connection.sendall(pack_request(request_id, operation, payload))
+        response_id, status, payload_size = RESPONSE_HEADER.unpack(
+            _receive_exactly(self._connection, RESPONSE_HEADER.size)
+        )
+        response = _receive_exactly(self._connection, payload_size)
+        if status != STATUS_OK:
+            raise CryptServiceError(response.decode())
+        if response_id != request_id:
+            raise ConnectionError(f'Ответ на запрос {response_id} вместо {request_id}')
+        return response
+
+    def ping(self):
+        self.request(OPERATION_PING)
+
+    def encrypt(self, data):
+        return self.request(OPERATION_ENCRYPT, data)
+
+    def decrypt(self, data):
+        return self.request(OPERATION_DECRYPT, data)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncCryptClient:
+    """Асинхронный клиент сервиса шифрования: запросы отправляются без ожидания ответов на предыдущие
+    (конвейер по одному соединению), ответы сопоставляются с запросами по номеру.
+    Создаётся через await AsyncCryptClient.connect(socket_path)"""
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._request_ids = itertools.count()
+        self._pending_responses = {}
+        self._receive_task = asyncio.create_task(self._receive_responses())
+
+    @classmethod
+    async def connect(cls, socket_path=DEFAULT_SOCKET_PATH):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        return cls(reader, writer)
+
+    async def _receive_responses(self):
+        try:
+            while True:
+                response_id, status, payload_size = RESPONSE_HEADER.unpack(
+                    await self._reader.readexactly(RESPONSE_HEADER.size)
+                )
+                payload = await self._reader.readexactly(payload_size)
+                response = self._pending_responses.pop(response_id, None)
+                if response is None or response.done():
+                    continue
+                if status == STATUS_OK:
+                    response.set_result(payload)
+                else:
+                    response.set_exception(CryptServiceError(payload.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            for response in self._pending_responses.values():
+                if not response.done():
+                    response.set_exception(ConnectionError(f'Сервис шифрования закрыл соединение: {error}'))
+            self._pending_responses.clear()
+
+    async def request(self, operation, payload=b''):
+        request_id = next(self._request_ids) % REQUEST_ID_LIMIT
+        response = asyncio.get_running_loop().create_future()
+        self._pending_responses[request_id] = response
+        self._writer.write(pack_request(request_id, operation, payload))
+        await self._writer.drain()
+        return await response
+
+    async def ping(self):
+        await self.request(OPERATION_PING)
+
+    async def encrypt(self, data):
+        return await self.request(OPERATION_ENCRYPT, data)
+
+    async def decrypt(self, data):
+        return await self.request(OPERATION_DECRYPT, data)
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receive_task.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+if __name__ == '__main__':
+    command_line_parser = argparse.ArgumentParser(
+        description='Шифрование/дешифрование файла через запущенный сервис шифрования (cryptservice.py)',
+    )
+    command_line_parser.add_argument('input_file', type=str, help='Путь до файла, который нужно шифровать/дешифровать')
+    command_line_parser.add_argument(
+        '-d',
+        '--decrypt',
+        help='Режим дешифрования файла (по умолчанию файл шифруется)',
+        action='store_true',
+    )
+    command_line_parser.add_argument('-o', '--output_file', type=str, help='Имя преобразованного файла')
+    command_line_parser.add_argument(
+        '-s',
+        '--socket_path',
+        type=str,
+        default=DEFAULT_SOCKET_PATH,
+        help=f'Путь до Unix-сокета сервиса (по умолчанию {DEFAULT_SOCKET_PATH})',
+    )
+    arguments = command_line_parser.parse_args()
+    with open(arguments.input_file, 'rb') as input_file_bytes:
+        input_data = input_file_bytes.read()
+    with CryptClient(arguments.socket_path) as client:
+        crypted_data = client.decrypt(input_data) if arguments.decrypt else client.encrypt(input_data)
+    output_file = arguments.output_file or f'{arguments.input_file}{".dec" if arguments.decrypt else ".enc"}'
+    with open(output_file, 'wb') as crypted_file:
+        crypted_file.write(crypted_data)
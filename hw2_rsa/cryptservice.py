@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import os
+import signal
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from blockcrypt import CODEBOOK_CACHE_DIR
+from ursacrypt import (DECRYPT_MODE, ENCRYPT_MODE, LAYOUT_BYTES, LAYOUT_DENSE, LAYOUT_UNIFIED, NUMPY_BACKEND,
+                       PYTHON_BACKEND, Cipher, VerbosePrint, get_key_components)
+
+DEFAULT_SOCKET_PATH = 'ursacrypt.sock'
+MAX_PAYLOAD_SIZE = 64 * 2 ** 20
+MAX_PIPELINED_REQUESTS = 64  # запросов одного соединения, обрабатываемых одновременно
+
+# Кадр запроса: номер запроса, операция, длина данных; кадр ответа: номер запроса, статус, длина данных.
+# Ответы приходят по мере готовности, не обязательно в порядке запросов, и сопоставляются по номеру
+REQUEST_HEADER = struct.Struct('>IBQ')
+RESPONSE_HEADER = struct.Struct('>IBQ')
+OPERATION_PING = 0
+OPERATION_ENCRYPT = 1
+OPERATION_DECRYPT = 2
+OPERATION_MODES = {OPERATION_ENCRYPT: ENCRYPT_MODE, OPERATION_DECRYPT: DECRYPT_MODE}
+STATUS_OK = 0
+STATUS_ERROR = 1  # данные ответа - текст ошибки в UTF-8
+
+THREAD_EXECUTOR = 'thread'
+PROCESS_EXECUTOR = 'process'
+
+
+def pack_request(request_id, operation, payload=b''):
+    return REQUEST_HEADER.pack(request_id, operation, len(payload)) + payload
+
+
+def pack_response(request_id, status, payload=b''):
+    return RESPONSE_HEADER.pack(request_id, status, len(payload)) + payload
+
+
+_worker_cipher = None  # шифр в процессе пула, создаётся в _init_worker
+
+
+def _init_worker(public_key, private_key, cipher_options):
+    global _worker_cipher
+    _worker_cipher = Cipher(public_key, private_key, **cipher_options)
+
+
+def _crypt_bytes_in_worker(data, mode):
+    return _worker_cipher.crypt_bytes(data, mode)
+
+
+class CryptService:
+    """Сервис шифрования uRSA на Unix-сокете: ключи загружаются один раз, запросы каждого соединения
+    читаются непрерывно и выполняются в пуле потоков или процессов, ответы отправляются по мере готовности.
+    Это убирает из каждого запроса запуск интерпретатора, разбор аргументов и чтение файлов ключей"""
+
+    def __init__(self, public_key=None, private_key=None, socket_path=DEFAULT_SOCKET_PATH, executor=THREAD_EXECUTOR,
+                 workers=None, verbose=False, **cipher_options):
+        self.socket_path = socket_path
+        self.verbose_print = VerbosePrint(verbose)
+        self.cipher = Cipher(public_key, private_key, **cipher_options)
+        if executor == PROCESS_EXECUTOR:
+            self.executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(public_key, private_key, cipher_options),
+            )
+            self._crypt_bytes = _crypt_bytes_in_worker
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+            self._crypt_bytes = self.cipher.crypt_bytes
+        self._server = None
+
+    async def _handle_request(self, request_id, operation, payload, writer, write_lock, pipeline_slots):
+        try:
+            if operation == OPERATION_PING:
+                response = pack_response(request_id, STATUS_OK)
+            else:
+                mode = OPERATION_MODES[operation]
+                crypted_payload = await asyncio.get_running_loop().run_in_executor(
+                    self.executor,
+                    self._crypt_bytes,
+                    payload,
+                    mode,
+                )
+                response = pack_response(request_id, STATUS_OK, crypted_payload)
+        except Exception as error:  # ошибка запроса возвращается клиенту, соединение не закрывается
+            response = pack_response(request_id, STATUS_ERROR, f'{type(error).__name__}: {error}'.encode())
+        finally:
+            pipeline_slots.release()
+
+        async with write_lock:
+            if not writer.is_closing():
+                writer.write(response)
+                await writer.drain()
+
+    async def _handle_connection(self, reader, writer):
+        self.verbose_print('Новое соединение')
+        pipeline_slots = asyncio.Semaphore(MAX_PIPELINED_REQUESTS)
+        write_lock = asyncio.Lock()
+        pending_requests = set()
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                request_id, operation, payload_size = REQUEST_HEADER.unpack(header)
+                if operation not in (OPERATION_PING, *OPERATION_MODES) or payload_size > MAX_PAYLOAD_SIZE:
+                    message = f'Неверная операция {operation} или длина данных {payload_size}'.encode()
+                    writer.write(pack_response(request_id, STATUS_ERROR, message))
+                    break
+                payload = await reader.readexactly(payload_size)
+
+                await pipeline_slots.acquire()
+                request = asyncio.create_task(
+                    self._handle_request(request_id, operation, payload, writer, write_lock, pipeline_slots)
+                )
+                pending_requests.add(request)
+                request.add_done_callback(pending_requests.discard)
+
+            if pending_requests:
+                await asyncio.wait(pending_requests)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            self.verbose_print('Соединение закрыто')
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # сокет, оставшийся от предыдущего запуска
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        self.verbose_print(f'Сервис шифрования слушает {self.socket_path}')
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self.executor.shutdown(cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+if __name__ == '__main__':
+    command_line_parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Сервис шифрования/дешифрования uRSA на локальном Unix-сокете',
+        epilog='''
+    Ключи загружаются один раз при запуске. Если не указаны -k/-p и -K/-P, используются public.key и private.key
+    из текущей директории (сервис запускается и с одним из них, тогда доступно только одно направление).
+
+    Пример запуска сервиса:
+    python cryptservice.py -s /tmp/ursacrypt.sock -k 17 3233 -K 2753 3233
+
+    Пример клиента (см. cryptclient.py):
+    python cryptclient.py -s /tmp/ursacrypt.sock test.txt -o test.txt.enc
+        '''
+    )
+    command_line_parser.add_argument(
+        '-s',
+        '--socket_path',
+        type=str,
+        default=DEFAULT_SOCKET_PATH,
+        help=f'Путь до Unix-сокета (по умолчанию {DEFAULT_SOCKET_PATH})',
+    )
+    public_key_group = command_line_parser.add_mutually_exclusive_group()
+    public_key_group.add_argument('-p', '--public_key_path', type=str, help='Путь до файла публичного ключа')
+    public_key_group.add_argument('-k', '--public_key', type=int, nargs=2, help='Публичный ключ (e n)')
+    private_key_group = command_line_parser.add_mutually_exclusive_group()
+    private_key_group.add_argument('-P', '--private_key_path', type=str, help='Путь до файла приватного ключа')
+    private_key_group.add_argument(
+        '-K',
+        '--private_key',
+        type=int,
+        nargs='+',
+        help='Приватный ключ (d n или d n p q dP dQ qInv)',
+    )
+    command_line_parser.add_argument(
+        '-e',
+        '--executor',
+        choices=(THREAD_EXECUTOR, PROCESS_EXECUTOR),
+        default=THREAD_EXECUTOR,
+        help='Пул для преобразования: thread или process (по умолчанию thread)',
+    )
+    command_line_parser.add_argument('-w', '--workers', type=int, help='Размер пула (по умолчанию - по числу ядер)')
+    command_line_parser.add_argument(
+        '-c',
+        '--codebook',
+        help='Преобразование блоков через кодовую книгу, только для n <= 65536',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '--codebook_dir',
+        type=str,
+        default=CODEBOOK_CACHE_DIR,
+        help=f'Директория кэша кодовых книг (по умолчанию {CODEBOOK_CACHE_DIR})',
+    )
+    command_line_parser.add_argument(
+        '--backend',
+        choices=(PYTHON_BACKEND, NUMPY_BACKEND),
+        default=PYTHON_BACKEND,
+        help='Реализация преобразования блоков: python или numpy',
+    )
+    command_line_parser.add_argument(
+        '--layout',
+        choices=(LAYOUT_UNIFIED, LAYOUT_DENSE, LAYOUT_BYTES),
+        help='Упаковка блоков при шифровании: unified, dense или bytes (по умолчанию - по длине ключа, '
+             'дешифрование определяет её по заголовку)',
+    )
+    command_line_parser.add_argument('-v', '--verbose', help='Вывод процесса в консоль', action='store_true')
+    arguments = command_line_parser.parse_args()
+    if arguments.private_key and len(arguments.private_key) not in (2, 7):
+        command_line_parser.error('опция -K ожидает 2 числа (d n) или 7 чисел (d n p q dP dQ qInv)')
+
+    def load_key(key, key_path, is_encrypt_mode):
+        if key or key_path:
+            return get_key_components(key, key_path, is_encrypt_mode)
+        default_key_path = 'public.key' if is_encrypt_mode else 'private.key'
+        return get_key_components(None, default_key_path, is_encrypt_mode) if os.path.isfile(default_key_path) else None
+
+    service = CryptService(
+        load_key(arguments.public_key, arguments.public_key_path, True),
+        load_key(arguments.private_key, arguments.private_key_path, False),
+        socket_path=arguments.socket_path,
+        executor=arguments.executor,
+        workers=arguments.workers,
+        verbose=arguments.verbose,
+        codebook=arguments.codebook,
+        codebook_dir=arguments.codebook_dir,
+        backend=arguments.backend,
+        layout=arguments.layout,
+    )
+
+    async def serve():
+        # SIGTERM, как и Ctrl+C, завершает сервис с закрытием пула и удалением файла сокета
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        await service.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,104 @@
+import cProfile
+import io
+import pstats
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+
+STAGES = ('read', 'transform', 'pack', 'write')
+DEFAULT_PROGRESS_INTERVAL = 0.2  # секунд между обновлениями строки прогресса
+PROFILE_TOP_COUNT = 20
+
+_NULL_STAGE = nullcontext()
+
+
+class _Stage:
+    """Таймер этапа: время между входом и выходом прибавляется к instrumentation.timings[name]"""
+
+    __slots__ = ('timings', 'name', 'start_time')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings[self.name] += time.perf_counter() - self.start_time
+
+
+class Instrumentation:
+    """Сбор метрик преобразования: суммарное время этапов (read, transform, pack, write), счётчики и профиль cProfile.
+    Выключенный объект не измеряет ничего: stage() возвращает общий пустой контекст, count() сразу возвращается.
+    Таймеры и счётчики ставятся на порцию данных, а не на блок, поэтому даже включённые почти не влияют на скорость"""
+
+    def __init__(self, enabled=False, profile=False):
+        self.enabled = enabled or profile
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+        self._profiler = cProfile.Profile() if profile else None
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self.timings, name)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def __enter__(self):
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profiler is not None:
+            self._profiler.disable()
+
+    def dump_profile(self, profile_path):
+        """Сохранение профиля в файл для pstats/snakeviz"""
+        self._profiler.dump_stats(profile_path)
+
+    def report(self):
+        """Текстовый отчёт: время этапов, счётчики и (если включено профилирование) самые долгие функции"""
+        lines = ['Этапы:']
+        for name in (*STAGES, *(name for name in self.timings if name not in STAGES)):
+            if name in self.timings:
+                lines.append(f'    {name:<12}{self.timings[name]:>12.4f} с')
+        lines.append('Счётчики:')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'    {name:<24}{value:>12}')
+        if self._profiler is not None:
+            profile_stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=profile_stream).sort_stats('cumulative').print_stats(PROFILE_TOP_COUNT)
+            lines.append(profile_stream.getvalue())
+
+        return '\n'.join(lines)
+
+
+NULL_INSTRUMENTATION = Instrumentation()
+
+
+class ProgressReporter:
+    """Вывод прогресса не чаще одного раза в interval секунд, независимо от того, как часто он вызывается.
+    Последнее значение (processed == total) выводится всегда"""
+
+    def __init__(self, total, interval=DEFAULT_PROGRESS_INTERVAL, stream=sys.stdout):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self._last_time = None
+
+    def __call__(self, processed):
+        now = time.monotonic()
+        if processed < self.total and self._last_time is not None and now - self._last_time < self.interval:
+            return
+
+        self._last_time = now
+        self.stream.write(f'\rProgress: {processed / self.total:2.2%}')
+        if processed >= self.total:
+            self.stream.write('\n')
+        self.stream.flush()
@@ -1,8 +1,15 @@
 import argparse
+import math
 import random
 
 from typing import Dict, Tuple
 
+SIEVE_SEGMENT_SIZE = 2 ** 15
+SMALL_PRIMES_LIMIT = 2 ** 16  # таблица малых простых чисел для отсева кандидатов
+PRIME_SEARCH_WINDOW = 4096  # количество нечётных кандидатов, отсеиваемых решетом за один раз
+PUBLIC_EXPONENTS = (65537, 257, 17, 5, 3)
+KEY_GENERATION_ATTEMPTS = 1000  # попыток подобрать p != q с подходящей e, прежде чем признать длину непригодной
+
 
 class VerbosePrint:
     """Класс для вывода сообщений в консоль в режиме verbose"""
@@ -18,15 +25,101 @@ class VerbosePrint:
             print(*args, **kwargs)
 
 
-def generate_primary_numbers(n_max=256):
-    primary_numbers = []
-    for number in range(2, n_max + 1):
-        if not any(map(lambda x: number % x == 0, primary_numbers)):
-            primary_numbers.append(number)
+def generate_primary_numbers(n_max=256, segment_size=SIEVE_SEGMENT_SIZE):
+    """Сегментированное решето Эратосфена: все простые числа <= n_max, память O(sqrt(n_max) + segment_size)"""
+    if n_max < 2:
+        return []
+
+    root = math.isqrt(n_max)
+    base_sieve = bytearray(b'\x01') * (root + 1)
+    base_sieve[:2] = b'\x00\x00'
+    for number in range(2, math.isqrt(root) + 1):
+        if base_sieve[number]:
+            base_sieve[number * number::number] = bytes(len(range(number * number, root + 1, number)))
+    base_primes = [number for number in range(2, root + 1) if base_sieve[number]]
+
+    primary_numbers = list(base_primes)
+    for segment_start in range(root + 1, n_max + 1, segment_size):
+        segment_end = min(segment_start + segment_size, n_max + 1)
+        segment = bytearray(b'\x01') * (segment_end - segment_start)
+        for prime in base_primes:
+            first_multiple = max(prime * prime, -(-segment_start // prime) * prime)
+            if first_multiple >= segment_end:
+                continue
+            segment[first_multiple - segment_start::prime] = bytes(len(range(first_multiple, segment_end, prime)))
+        primary_numbers.extend(segment_start + index for index, is_prime in enumerate(segment) if is_prime)
 
     return primary_numbers
 
 
+SMALL_PRIMES = generate_primary_numbers(SMALL_PRIMES_LIMIT)
+
+
+def get_miller_rabin_rounds(bits):
+    """Количество раундов Миллера-Рабина для случайного кандидата длиной bits бит (вероятность ошибки < 2^-100)"""
+    if bits >= 1024:
+        return 5
+    if bits >= 512:
+        return 8
+    return 40
+
+
+def is_probable_prime(number, rng, rounds=None):
+    """Вероятностная проверка простоты числа тестом Миллера-Рабина"""
+    if number < 2:
+        return False
+    for prime in SMALL_PRIMES[:16]:
+        if number % prime == 0:
+            return number == prime
+
+    rounds = rounds or get_miller_rabin_rounds(number.bit_length())
+    odd_part, power_of_two = number - 1, 0
+    while not odd_part & 1:
+        odd_part >>= 1
+        power_of_two += 1
+
+    for _ in range(rounds):
+        witness = pow(rng.randrange(2, number - 1), odd_part, number)
+        if witness == 1 or witness == number - 1:
+            continue
+        for _ in range(power_of_two - 1):
+            witness = pow(witness, 2, number)
+            if witness == number - 1:
+                break
+        else:
+            return False
+
+    return True
+
+
+def generate_large_prime(bits, rng):
+    """Генерация случайного простого числа длиной ровно bits бит (два старших бита установлены, поэтому
+    произведение двух таких чисел имеет длину ровно 2 * bits бит).
+    Кандидаты из окна после случайного числа отсеиваются решетом по таблице малых простых чисел,
+    тест Миллера-Рабина выполняется только для оставшихся"""
+    if bits < 2:
+        raise ValueError(f'Невозможно сгенерировать простое число длиной {bits} бит')
+    if bits <= SMALL_PRIMES_LIMIT.bit_length() - 1:
+        candidates = [prime for prime in SMALL_PRIMES if prime.bit_length() == bits and prime >> (bits - 2) == 0b11]
+        return rng.choice(candidates or [prime for prime in SMALL_PRIMES if prime.bit_length() == bits])
+
+    while True:
+        start = rng.getrandbits(bits) | (0b11 << (bits - 2)) | 1
+        window = bytearray(b'\x01') * PRIME_SEARCH_WINDOW  # window[i] - кандидат start + 2 * i
+        for prime in SMALL_PRIMES[1:]:
+            first_index = (-start * ((prime + 1) // 2)) % prime  # start + 2 * i ≡ 0 (mod prime)
+            window[first_index::prime] = bytes(len(range(first_index, PRIME_SEARCH_WINDOW, prime)))
+
+        for index in range(PRIME_SEARCH_WINDOW):
+            if not window[index]:
+                continue
+            candidate = start + 2 * index
+            if candidate.bit_length() != bits:
+                break
+            if is_probable_prime(candidate, rng):
+                return candidate
+
+
 def find_border_index(euler_value, primary_numbers):
     index = 0
     while index < len(primary_numbers) and primary_numbers[index] < euler_value:
@@ -36,14 +129,65 @@ def find_border_index(euler_value, primary_numbers):
 
 
 def find_d(e, euler_value):
-    for d in range(2, euler_value):
-        if (d * e) % euler_value == 1:
-            return d
+    """Поиск d - обратного к e по модулю Ф(n) (расширенный алгоритм Евклида)"""
+    try:
+        return pow(e, -1, euler_value)
+    except ValueError:
+        raise ValueError(f'Обратное к e={e} число d не найдено!') from None
+
+
+def get_crt_components(d, p, q):
+    """Компоненты расширенного приватного ключа для дешифрования по китайской теореме об остатках:
+    dP = d mod (p - 1), dQ = d mod (q - 1), qInv = q^-1 mod p"""
+    return d % (p - 1), d % (q - 1), pow(q, -1, p)
+
+
+def choose_public_exponent(euler_value):
+    """Выбор открытой экспоненты e для ключей заданной длины: 65537 или меньшее простое число Ферма"""
+    for e in PUBLIC_EXPONENTS:
+        if e < euler_value and math.gcd(e, euler_value) == 1:
+            return e
+
+    raise ValueError(f'Не найдена открытая экспонента для Ф(n) = {euler_value}')
+
 
-    raise ValueError(f'Обратное к e={e} число d не найдено!')
+def generate_sized_key_components(bits, rng):
+    """Генерация компонентов ключа (e, d, n, p, q) с модулем n длиной ровно bits бит.
+    Для очень коротких модулей (например, 4, 6 и 8 бит) простое число нужной длины с двумя старшими битами
+    единственное, и p == q на каждой попытке - после KEY_GENERATION_ATTEMPTS попыток возникает ValueError"""
+    for _ in range(KEY_GENERATION_ATTEMPTS):
+        p = generate_large_prime(bits - bits // 2, rng)
+        q = generate_large_prime(bits // 2, rng)
+        euler_function_value = (p - 1) * (q - 1)
+        if p == q:
+            continue
+        try:
+            e = choose_public_exponent(euler_function_value)
+        except ValueError:
+            continue
+        return e, find_d(e, euler_function_value), p * q, p, q
 
+    raise ValueError(f'Не удалось сгенерировать ключ с модулем длиной {bits} бит: '
+                     f'слишком мало подходящих простых чисел')
 
-def main(seed=None, verbose=False) -> Dict[str, Tuple[int, int]]:
+
+def generate_key_pair(bits, rng=None):
+    """Генерация пары ключей с модулем длиной bits бит без записи в файлы и без изменения глобального random"""
+    rng = rng or random.SystemRandom()
+    e, d, n, p, q = generate_sized_key_components(bits, rng)
+    return {'public_key': (e, n), 'private_key': (d, n), 'crt_components': (p, q, *get_crt_components(d, p, q))}
+
+
+def write_key_files(key_pair, public_key_path='public.key', private_key_path='private.key'):
+    """Запись публичного ключа 'e n' и расширенного приватного ключа 'd n p q dP dQ qInv' в файлы"""
+    with open(public_key_path, 'w') as public_key:
+        public_key.write(' '.join(map(str, key_pair['public_key'])))
+
+    with open(private_key_path, 'w') as private_key:
+        private_key.write(' '.join(map(str, (*key_pair['private_key'], *key_pair['crt_components']))))
+
+
+def main(seed=None, verbose=False, bits=None) -> Dict[str, Tuple[int, ...]]:
     verbose_print = VerbosePrint(verbose)
     verbose_print(
         'Генератор RSA ключей',
@@ -52,38 +196,56 @@ def main(seed=None, verbose=False) -> Dict[str, Tuple[int, int]]:
         sep='\n',
         end='\n----------\n\n'
     )
-    random.seed(seed)
-    verbose_print('Начало генерации множества простых чисел')
-    primary_numbers = generate_primary_numbers()
-    verbose_print('Количество простых чисел:', len(primary_numbers))
-    p, q = (primary_numbers.pop(random.randint(0, len(primary_numbers))) for _ in range(2))
-    verbose_print(f'Полученные значения p = {p}, q = {q}')
-    n: int = p * q
-    euler_function_value = (p - 1) * (q - 1)
-    verbose_print(f'Подсчитанные значения n = {n}, Ф(n) = {euler_function_value}')
-    e_prim = primary_numbers[:find_border_index(euler_function_value, primary_numbers)]
-    e_prim = list(filter(lambda x: euler_function_value % x != 0, e_prim))
-    e: int = random.choice(e_prim)
-    verbose_print(f'Полученное значение e = {e}')
-    d: int = find_d(e, euler_function_value)
-    verbose_print(f'Найденное значение d = {d}')
+    if bits:
+        # Ключ заданной длины: случайные большие простые числа, при заданном зерне - воспроизводимые
+        rng = random.Random(seed) if seed is not None else random.SystemRandom()
+        verbose_print(f'Генерация простых чисел p, q для модуля длиной {bits} бит')
+        e, d, n, p, q = generate_sized_key_components(bits, rng)
+        verbose_print(f'Полученные значения p = {p}, q = {q}')
+        verbose_print(f'Подсчитанное значение n = {n}')
+        verbose_print(f'Полученное значение e = {e}')
+        verbose_print(f'Найденное значение d = {d}')
+    else:
+        random.seed(seed)
+        verbose_print('Начало генерации множества простых чисел')
+        primary_numbers = generate_primary_numbers()
+        verbose_print('Количество простых чисел:', len(primary_numbers))
+        p, q = (primary_numbers.pop(random.randint(0, len(primary_numbers))) for _ in range(2))
+        verbose_print(f'Полученные значения p = {p}, q = {q}')
+        n: int = p * q
+        euler_function_value = (p - 1) * (q - 1)
+        verbose_print(f'Подсчитанные значения n = {n}, Ф(n) = {euler_function_value}')
+        e_prim = primary_numbers[:find_border_index(euler_function_value, primary_numbers)]
+        e_prim = list(filter(lambda x: euler_function_value % x != 0, e_prim))
+        e: int = random.choice(e_prim)
+        verbose_print(f'Полученное значение e = {e}')
+        d: int = find_d(e, euler_function_value)
+        verbose_print(f'Найденное значение d = {d}')
     verbose_print(f'\n--- Публичный ключ: ({e}, {n}) ---')
     verbose_print(f'\n--- Приватный ключ: ({d}, {n}) ---', end='\n\n')
+    key_pair = {'public_key': (e, n), 'private_key': (d, n), 'crt_components': (p, q, *get_crt_components(d, p, q))}
 
-    verbose_print(f'Запись публичного ключа в файл public.key')
-    with open('public.key', 'w') as public_key:
-        public_key.write(f'{e} {n}')
+    verbose_print('Запись публичного ключа в файл public.key')
+    verbose_print('Запись расширенного приватного ключа (d n p q dP dQ qInv) в файл private.key')
+    write_key_files(key_pair)
 
-    verbose_print(f'Запись приватного ключа в файл private.key')
-    with open('private.key', 'w') as private_key:
-        private_key.write(f'{d} {n}')
-
-    return {'public_key': (e, n), 'private_key': (d, n)}
+    return key_pair
 
 
 if __name__ == '__main__':
     command_line_parser = argparse.ArgumentParser(description='RSA генератор открытого и закрытого ключей')
     command_line_parser.add_argument('-s', '--seed', type=int, help='Случайное зерно (random seed)')
+    command_line_parser.add_argument(
+        '-b',
+        '--bits',
+        type=int,
+        help='Длина модуля n в битах (например, 2048). Без опции генерируется учебный ключ из простых чисел <= 256. '
+             'Ключ 1024 или 2048 бит генерируется обычно быстрее секунды, 4096 бит - от 2 до 15 с, '
+             'что выше цели в секунду: время ограничено возведением в степень по модулю в CPython',
+    )
     command_line_parser.add_argument('-v', '--verbose', help='Вывод процесса в консоль', action='store_true')
     options = command_line_parser.parse_args()
-    main(options.seed, options.verbose)
+    try:
+        main(options.seed, options.verbose, options.bits)
+    except ValueError as error:
+        command_line_parser.error(str(error))
@@ -0,0 +1,236 @@
+import argparse
+import os
+import random
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from keygen import VerbosePrint, generate_key_pair, write_key_files
+
+DEFAULT_KEY_BITS = 2048
+DEFAULT_POOL_SIZE = 64
+
+
+def _generate_key_pair_in_worker(bits, seed=None):
+    return generate_key_pair(bits, random.Random(seed) if seed is not None else None)
+
+
+def generate_key_pairs(count, bits=DEFAULT_KEY_BITS, jobs=None, seed=None):
+    """Генерация count пар ключей в пуле процессов. Пары выдаются по порядку по мере готовности.
+    При заданном зерне i-я пара генерируется из зерна '<seed>-<i>' и воспроизводима"""
+    seeds = [None] * count if seed is None else [f'{seed}-{index}' for index in range(count)]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(_generate_key_pair_in_worker, [bits] * count, seeds)
+
+
+class KeyStore:
+    """Индексированное хранилище пар ключей: по строке 'e n d p q dP dQ qInv' на пару в файле path
+    и смещения строк (uint64) в файле path + '.idx', поэтому пара по номеру читается без просмотра файла.
+    Индекс дописывается после строк хранилища, поэтому после прерванной записи или замены файла хранилища
+    он может с ним расходиться - при открытии индекс проверяется и при расхождении строится заново"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = f'{path}.idx'
+        self._offsets = array('Q')
+        self._lock = threading.Lock()
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'rb') as index_file:
+                index_data = index_file.read()
+            self._offsets.frombytes(index_data[:len(index_data) - len(index_data) % self._offsets.itemsize])
+        if not self._is_index_valid():
+            self._rebuild_index()
+
+    def _is_index_valid(self):
+        """Проверка индекса по файлу хранилища: смещений столько же, сколько строк, первое смещение - 0,
+        а последнее - начало последней строки, которая заканчивается в конце файла"""
+        if not os.path.isfile(self.path):
+            return not self._offsets
+
+        with open(self.path, 'rb') as key_store_file:
+            lines_count = sum(chunk.count(b'\n') for chunk in iter(lambda: key_store_file.read(2 ** 20), b''))
+            key_store_size = key_store_file.tell()
+            if lines_count != len(self._offsets):
+                return False
+            if not self._offsets:
+                return key_store_size == 0
+            if self._offsets[0] != 0 or self._offsets[-1] >= key_store_size:
+                return False
+
+            key_store_file.seek(max(0, self._offsets[-1] - 1))
+            previous_byte = key_store_file.read(1) if self._offsets[-1] else b'\n'
+            return previous_byte == b'\n' and len(key_store_file.readline()) == key_store_size - self._offsets[-1]
+
+    def _rebuild_index(self):
+        """Восстановление индекса по файлу хранилища. Неполная последняя строка (прерванная запись, пара из неё
+        ещё не была выдана) отбрасывается"""
+        self._offsets = array('Q')
+        if os.path.isfile(self.path):
+            with open(self.path, 'r+b') as key_store_file:
+                offset = 0
+                for line in key_store_file:
+                    if not line.endswith(b'\n'):
+                        key_store_file.truncate(offset)
+                        break
+                    self._offsets.append(offset)
+                    offset += len(line)
+
+        with open(self.index_path, 'wb') as index_file:
+            index_file.write(self._offsets.tobytes())
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def extend(self, key_pairs):
+        """Добавление пар ключей в конец хранилища, возвращает номер первой добавленной пары"""
+        with self._lock:
+            first_index = len(self._offsets)
+            new_offsets = array('Q')
+            with open(self.path, 'ab') as key_store_file:
+                offset = key_store_file.tell()
+                for key_pair in key_pairs:
+                    e, n = key_pair['public_key']
+                    d, _ = key_pair['private_key']
+                    line = ' '.join(map(str, (e, n, d, *key_pair['crt_components']))).encode() + b'\n'
+                    key_store_file.write(line)
+                    new_offsets.append(offset)
+                    offset += len(line)
+
+            with open(self.index_path, 'ab') as index_file:
+                index_file.write(new_offsets.tobytes())
+            self._offsets.extend(new_offsets)
+            return first_index
+
+    def append(self, key_pair):
+        return self.extend([key_pair])
+
+    def __getitem__(self, index):
+        with open(self.path, 'rb') as key_store_file:
+            key_store_file.seek(self._offsets[index])
+            e, n, d, *crt_components = map(int, key_store_file.readline().split())
+
+        return {'public_key': (e, n), 'private_key': (d, n), 'crt_components': tuple(crt_components)}
+
+    def export(self, index, public_key_path='public.key', private_key_path='private.key'):
+        """Запись пары ключей с номером index в файлы ключей, как после keygen.py"""
+        write_key_files(self[index], public_key_path, private_key_path)
+
+
+class KeyPool:
+    """Пул заранее сгенерированных пар ключей. get() выдаёт готовую пару без поиска простых чисел,
+    фоновый поток пополняет пул в пуле процессов, когда в нём остаётся меньше refill_threshold пар.
+    Если задано хранилище key_store, каждая выданная пара записывается в него, её номер - ключ 'index'"""
+
+    def __init__(self, bits=DEFAULT_KEY_BITS, size=DEFAULT_POOL_SIZE, refill_threshold=None, jobs=None,
+                 key_store=None):
+        self.bits = bits
+        self.size = size
+        self.refill_threshold = refill_threshold if refill_threshold is not None else size // 2
+        self.key_store = key_store
+        self._key_pairs = deque()
+        self._condition = threading.Condition()
+        self._is_closed = False
+        self._executor = ProcessPoolExecutor(max_workers=jobs)
+        self._refill_thread = threading.Thread(target=self._refill, name='KeyPoolRefill', daemon=True)
+        self._refill_thread.start()
+
+    def _refill(self):
+        pending_key_pairs = set()
+        while True:
+            with self._condition:
+                while not self._is_closed and not pending_key_pairs and len(self._key_pairs) >= self.refill_threshold:
+                    self._condition.wait()
+                if self._is_closed:
+                    return
+                missing_count = self.size - len(self._key_pairs) - len(pending_key_pairs)
+
+            for _ in range(max(0, missing_count)):
+                pending_key_pairs.add(self._executor.submit(_generate_key_pair_in_worker, self.bits))
+
+            done_key_pairs, pending_key_pairs = wait(pending_key_pairs, return_when=FIRST_COMPLETED)
+            with self._condition:
+                if self._is_closed:
+                    return
+                self._key_pairs.extend(key_pair.result() for key_pair in done_key_pairs)
+                self._condition.notify_all()
+
+    def __len__(self):
+        return len(self._key_pairs)
+
+    def get(self, timeout=None):
+        """Получение пары ключей. Если пул пуст, ожидание следующей сгенерированной пары"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._key_pairs or self._is_closed, timeout):
+                raise TimeoutError('Пул ключей пуст')
+            if self._is_closed:
+                raise RuntimeError('Пул ключей закрыт')
+
+            key_pair = self._key_pairs.popleft()
+            self._condition.notify_all()
+
+        if self.key_store is not None:
+            key_pair['index'] = self.key_store.append(key_pair)
+        return key_pair
+
+    def close(self):
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._refill_thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == '__main__':
+    command_line_parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Пакетная генерация пар RSA ключей в индексированное хранилище',
+        epilog='''
+    Пример генерации 1000 пар 2048-битных ключей в 8 процессах:
+    python keypool.py tenants.keys -n 1000 -b 2048 -j 8
+
+    Пример выгрузки пары с номером 42 в файлы public.key и private.key:
+    python keypool.py tenants.keys -e 42
+        '''
+    )
+    command_line_parser.add_argument('key_store', type=str, help='Путь до файла хранилища ключей')
+    command_line_parser.add_argument('-n', '--count', type=int, default=0, help='Количество генерируемых пар')
+    command_line_parser.add_argument(
+        '-b',
+        '--bits',
+        type=int,
+        default=DEFAULT_KEY_BITS,
+        help=f'Длина модуля n в битах (по умолчанию {DEFAULT_KEY_BITS})',
+    )
+    command_line_parser.add_argument('-j', '--jobs', type=int, help='Количество процессов (по умолчанию - все ядра)')
+    command_line_parser.add_argument('-s', '--seed', type=str, help='Случайное зерно (random seed)')
+    command_line_parser.add_argument(
+        '-e',
+        '--export',
+        type=int,
+        help='Выгрузить пару с указанным номером в файлы public.key и private.key',
+    )
+    command_line_parser.add_argument('-v', '--verbose', help='Вывод процесса в консоль', action='store_true')
+    arguments = command_line_parser.parse_args()
+    verbose_print = VerbosePrint(arguments.verbose)
+    store = KeyStore(arguments.key_store)
+    if arguments.count:
+        verbose_print(f'Генерация {arguments.count} пар ключей длиной {arguments.bits} бит в {arguments.key_store}')
+        batch = []
+        for key_pair in generate_key_pairs(arguments.count, arguments.bits, arguments.jobs, arguments.seed):
+            batch.append(key_pair)
+            if len(batch) >= DEFAULT_POOL_SIZE:
+                store.extend(batch)
+                batch.clear()
+                verbose_print(f'Записано пар: {len(store)}')
+        store.extend(batch)
+        verbose_print(f'Всего пар в хранилище: {len(store)}')
+    if arguments.export is not None:
+        verbose_print(f'Выгрузка пары №{arguments.export} в public.key и private.key')
+        store.export(arguments.export)
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from cryptclient import AsyncCryptClient, CryptClient
+from cryptservice import DEFAULT_SOCKET_PATH
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PUBLIC_KEY = (17, 3233)
+DEFAULT_PRIVATE_KEY = (2753, 3233)
+SERVICE_START_TIMEOUT = 10  # секунд ожидания запуска сервиса
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def get_percentile(sorted_values, percentile):
+    return sorted_values[min(len(sorted_values) - 1, int(percentile * len(sorted_values)))]
+
+
+def print_latency_report(title, latencies, elapsed, payload_size):
+    """Вывод числа запросов в секунду, пропускной способности и перцентилей задержки в миллисекундах"""
+    latencies = sorted(latencies)
+    print(title)
+    print(f'    запросов: {len(latencies)}, время: {elapsed:.3f} с, {len(latencies) / elapsed:.1f} запросов/с, '
+          f'{len(latencies) * payload_size / 2 ** 20 / elapsed:.3f} МБ/с')
+    percentiles = ', '.join(f'p{percentile * 100:g} = {get_percentile(latencies, percentile) * 1000:.3f}'
+                            for percentile in PERCENTILES)
+    print(f'    задержка, мс: {percentiles}, max = {latencies[-1] * 1000:.3f}')
+
+
+def start_service(socket_path, public_key, private_key, executor, workers=None):
+    """Запуск сервиса шифрования в отдельном процессе и ожидание, пока он начнёт отвечать"""
+    command = [
+        sys.executable,
+        os.path.join(SCRIPT_DIR, 'cryptservice.py'),
+        '-s', socket_path,
+        '-k', *map(str, public_key),
+        '-K', *map(str, private_key),
+        '-e', executor,
+    ]
+    if workers:
+        command += ['-w', str(workers)]
+    service_process = subprocess.Popen(command)
+    deadline = time.monotonic() + SERVICE_START_TIMEOUT
+    while True:
+        try:
+            with CryptClient(socket_path) as client:
+                client.ping()
+            return service_process
+        except (FileNotFoundError, ConnectionError):
+            if service_process.poll() is not None or time.monotonic() > deadline:
+                service_process.kill()
+                raise RuntimeError(f'Сервис шифрования не запустился на {socket_path}')
+            time.sleep(0.05)
+
+
+async def run_load(socket_path, requests_count, concurrency, connections, payload_size, verify=False):
+    """Нагрузка на сервис: concurrency одновременных запросов шифрования через connections соединений.
+    Возвращает (задержки запросов в секундах, общее время, количество несовпадений при проверке)"""
+    clients = [await AsyncCryptClient.connect(socket_path) for _ in range(connections)]
+    payload = os.urandom(payload_size)
+    request_numbers = iter(range(requests_count))  # общий итератор: каждый запрос берёт ровно один исполнитель
+    latencies = []
+    mismatches_count = 0
+
+    async def send_requests(client):
+        nonlocal mismatches_count
+        for _ in request_numbers:
+            start_time = time.perf_counter()
+            encrypted_payload = await client.encrypt(payload)
+            latencies.append(time.perf_counter() - start_time)
+            if verify and await client.decrypt(encrypted_payload) != payload:
+                mismatches_count += 1
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(send_requests(clients[index % connections]) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    for client in clients:
+        await client.close()
+
+    return latencies, elapsed, mismatches_count
+
+
+def run_subprocess_baseline(requests_count, payload_size, public_key):
+    """Задержка прежнего способа: запуск ursacrypt.py отдельным процессом с временными файлами на каждый запрос"""
+    latencies = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_file = os.path.join(work_dir, 'payload.bin')
+        with open(input_file, 'wb') as payload_file:
+            payload_file.write(os.urandom(payload_size))
+        start_time = time.perf_counter()
+        for _ in range(requests_count):
+            request_start_time = time.perf_counter()
+            subprocess.run(
+                [sys.executable, os.path.join(SCRIPT_DIR, 'ursacrypt.py'), input_file, '-k', *map(str, public_key)],
+                check=True,
+            )
+            latencies.append(time.perf_counter() - request_start_time)
+
+    return latencies, time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    command_line_parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Нагрузочный тест сервиса шифрования (cryptservice.py) на локальном Unix-сокете',
+        epilog='''
+    Пример запуска сервиса и теста из 10000 запросов по 64 байта, 16 одновременно, со сравнением
+    с запуском ursacrypt.py отдельным процессом на каждый запрос:
+    python loadtest.py --spawn -n 10000 -c 16 --size 64 --subprocess_baseline 20
+
+    Пример теста уже запущенного сервиса:
+    python loadtest.py -s /tmp/ursacrypt.sock -n 1000 --verify
+        '''
+    )
+    command_line_parser.add_argument(
+        '-s',
+        '--socket_path',
+        type=str,
+        default=DEFAULT_SOCKET_PATH,
+        help=f'Путь до Unix-сокета сервиса (по умолчанию {DEFAULT_SOCKET_PATH})',
+    )
+    command_line_parser.add_argument(
+        '--spawn',
+        help='Запустить сервис на время теста (ключи -k и -K, по умолчанию учебные 17 3233 и 2753 3233)',
+        action='store_true',
+    )
+    command_line_parser.add_argument('-k', '--public_key', type=int, nargs=2, default=DEFAULT_PUBLIC_KEY)
+    command_line_parser.add_argument('-K', '--private_key', type=int, nargs='+', default=DEFAULT_PRIVATE_KEY)
+    command_line_parser.add_argument(
+        '-e',
+        '--executor',
+        choices=('thread', 'process'),
+        default='thread',
+        help='Пул запускаемого сервиса (см. cryptservice.py)',
+    )
+    command_line_parser.add_argument('-w', '--workers', type=int, help='Размер пула запускаемого сервиса')
+    command_line_parser.add_argument('-n', '--requests', type=int, default=10000, help='Количество запросов')
+    command_line_parser.add_argument('-c', '--concurrency', type=int, default=16, help='Одновременных запросов')
+    command_line_parser.add_argument('--connections', type=int, default=1, help='Количество соединений')
+    command_line_parser.add_argument('--size', type=int, default=64, help='Размер данных запроса в байтах')
+    command_line_parser.add_argument(
+        '--verify',
+        help='Проверять, что дешифрование ответа возвращает исходные данные',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '--subprocess_baseline',
+        type=int,
+        default=0,
+        help='Количество запусков ursacrypt.py отдельным процессом для сравнения задержки',
+    )
+    arguments = command_line_parser.parse_args()
+    if len(arguments.private_key) not in (2, 7):
+        command_line_parser.error('опция -K ожидает 2 числа (d n) или 7 чисел (d n p q dP dQ qInv)')
+    spawned_service = None
+    if arguments.spawn:
+        spawned_service = start_service(
+            arguments.socket_path,
+            arguments.public_key,
+            arguments.private_key,
+            arguments.executor,
+            arguments.workers,
+        )
+    try:
+        load_latencies, load_elapsed, load_mismatches = asyncio.run(run_load(
+            arguments.socket_path,
+            arguments.requests,
+            arguments.concurrency,
+            arguments.connections,
+            arguments.size,
+            arguments.verify,
+        ))
+    finally:
+        if spawned_service is not None:
+            spawned_service.terminate()
+            spawned_service.wait()
+    print_latency_report('Сервис шифрования:', load_latencies, load_elapsed, arguments.size)
+    if arguments.verify:
+        print(f'    несовпадений при дешифровании: {load_mismatches}')
+    if arguments.subprocess_baseline:
+        print_latency_report(
+            'Запуск ursacrypt.py отдельным процессом:',
+            *run_subprocess_baseline(arguments.subprocess_baseline, arguments.size, arguments.public_key),
+            arguments.size,
+        )
@@ -0,0 +1,46 @@
+import mmap
+from contextlib import contextmanager
+
+
+@contextmanager
+def map_input_file(input_file):
+    """Отображение входного файла в память только для чтения (данные берутся из страничного кэша без копирования)"""
+    with open(input_file, 'rb') as input_file_bytes:
+        with mmap.mmap(input_file_bytes.fileno(), 0, access=mmap.ACCESS_READ) as input_map:
+            yield input_map
+
+
+class MappedOutput:
+    """Запись в заранее выделенный файл известного размера через отображение в память.
+    Поддерживает только write(), как и выходной поток crypt_stream"""
+
+    def __init__(self, output_file, size):
+        self.size = size
+        self.position = 0
+        self._file = open(output_file, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size) if size else None
+
+    def write(self, data):
+        end = self.position + len(data)
+        if end > self.size:
+            raise ValueError(f'Результат длиннее ожидаемых {self.size} байт: неверный ключ или повреждённый файл')
+
+        self._map[self.position:end] = data
+        self.position = end
+        return len(data)
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+        if self.position != self.size:
+            self._file.truncate(self.position)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,63 @@
+try:
+    import numpy
+except ImportError:  # NumPy - необязательная зависимость, без неё используется реализация на Python
+    numpy = None
+
+from blockcrypt import CODEBOOK_CACHE_DIR, load_codebook
+
+NUMPY_MAX_MODULUS = 2 ** 32  # произведение двух остатков (n - 1) ** 2 должно помещаться в uint64
+
+
+def is_available(key_base):
+    """Проверка, может ли NumPy-бэкенд работать с модулем key_base"""
+    return numpy is not None and key_base <= NUMPY_MAX_MODULUS
+
+
+def pow_mod(blocks, key_var, key_base):
+    """Векторное возведение массива блоков в степень key_var по модулю key_base (square-and-multiply)"""
+    result = numpy.ones_like(blocks) % key_base
+    base = blocks % key_base
+    while key_var:
+        if key_var & 1:
+            result = result * base % key_base
+        key_var >>= 1
+        if key_var:
+            base = base * base % key_base
+
+    return result
+
+
+def unpack_blocks(data, bits_step):
+    """Разбиение байтов data на массив uint64 из целых блоков по bits_step бит (неполный хвост отбрасывается)"""
+    bits = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))
+    blocks_count = len(bits) // bits_step
+    bits = bits[:blocks_count * bits_step].reshape(blocks_count, bits_step)
+    blocks = numpy.zeros(blocks_count, dtype=numpy.uint64)
+    for bit_index in range(bits_step):
+        blocks <<= numpy.uint64(1)
+        blocks |= bits[:, bit_index]
+
+    return blocks
+
+
+def pack_blocks(blocks, bits_step):
+    """Упаковка массива блоков по bits_step бит обратно в байты (len(blocks) * bits_step должно быть кратно 8)"""
+    bits = numpy.empty((len(blocks), bits_step), dtype=numpy.uint8)
+    for bit_index in range(bits_step):
+        bits[:, bit_index] = (blocks >> numpy.uint64(bits_step - 1 - bit_index)) & numpy.uint64(1)
+
+    return numpy.packbits(bits.ravel()).tobytes()
+
+
+def get_block_array_crypter(key_var, key_base, codebook=False, codebook_dir=CODEBOOK_CACHE_DIR):
+    """Получение векторной функции преобразования массива блоков: blocks -> (blocks ** key_var) % key_base.
+    Возвращает None, если NumPy не установлен или модуль слишком велик для uint64"""
+    if not is_available(key_base):
+        return None
+
+    if codebook:
+        table = numpy.frombuffer(load_codebook(key_var, key_base, codebook_dir), dtype=numpy.uint16)
+        table = table.astype(numpy.uint64)
+        return lambda blocks: table[blocks % numpy.uint64(key_base)]
+
+    return lambda blocks: pow_mod(blocks, key_var, numpy.uint64(key_base))
@@ -1,8 +1,21 @@
 import argparse
-import math
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from bitstream import BitReader, BitWriter
+from blockcrypt import CODEBOOK_CACHE_DIR, DEFAULT_BLOCK_CACHE_MEMORY, BlockCache, get_block_crypter
+from instrumentation import NULL_INSTRUMENTATION, Instrumentation
+from mmapio import map_input_file
 
 ENCRYPT_MODE = 'ENCRYPT_MODE'
 DECRYPT_MODE = 'DECRYPT_MODE'
+SEEK_INDEX_INTERVAL = 4096  # блоков открытого текста между точками индекса (кратно 8 - сегмент из целых байтов)
+SEEK_INDEX_SIGNATURE = b'EBCI'
+SEEK_INDEX_VERSION = 1
+SEEK_INDEX_HEADER_FORMAT = '>4sBHIQQQI'
+SEEK_INDEX_CHECK_SIZE = 2 ** 16  # байт в начале и в конце шифротекста, по которым индекс привязывается к нему
 
 
 class VerbosePrint:
@@ -20,102 +33,342 @@ class VerbosePrint:
 
 
 def get_key_components(key, key_path, is_encrypt_mode):
-    """Получение пары (e, n) в режиме шифрования или (d, n) в режиме дешифрования"""
+    """Получение пары (e, n) в режиме шифрования или (d, n) в режиме дешифрования.
+    Расширенный приватный ключ 'd n p q dP dQ qInv' возвращается целиком: (d, n, p, q, dP, dQ, qInv)"""
     if key:
-        return key
+        return tuple(key)
 
     if not key_path:
         key_path = 'public.key' if is_encrypt_mode else 'private.key'
 
     with open(key_path, 'r') as public_key_file:
-        return map(int, public_key_file.readlines()[0].strip().split())
+        key_components = tuple(map(int, public_key_file.readlines()[0].strip().split()))
 
+    if len(key_components) not in (2, 7):
+        raise ValueError(f'Неверный формат ключа в файле {key_path}: ожидается "e n", "d n" или "d n p q dP dQ qInv"')
+    return key_components
 
-def bytes_to_binary_view(bytes_message):
-    """Функция для преобразования bytes-строки в бинарное представление"""
-    return ''.join(map(lambda x: '{:0>8b}'.format(x), bytes_message))
 
+def crypt_blocks(data, crypt_block, bits_step, mode=ENCRYPT_MODE, verbose_print=None, seek_index=None, start_bit=0,
+                 blocks_limit=None, instrumentation=NULL_INSTRUMENTATION):
+    """Преобразование данных по схеме EBC: блоки по bits_step бит, перед блоком шифротекста длиной bits_step + 1 бит
+    записывается флаг из bits_step единиц.
 
-def crypt(input_file: str, mode=ENCRYPT_MODE, output_file=None, key=None, key_path=None, verbose=False):
-    """Главный метод модуля"""
+    При шифровании в список seek_index добавляются битовые смещения шифротекста каждые SEEK_INDEX_INTERVAL блоков.
+    При дешифровании start_bit - смещение первого блока в data, blocks_limit - количество дешифруемых блоков.
+    Цикл EBC последовательный (длина блока зависит от флага), поэтому он целиком учитывается как этап transform,
+    а счётчики блоков копятся в локальных переменных и передаются в instrumentation один раз в конце"""
+    is_encrypt_mode = mode == ENCRYPT_MODE
+    is_decrypt_mode = mode == DECRYPT_MODE
+    verbose_print = verbose_print or VerbosePrint()
+    verbose = verbose_print.verbose
+
+    reader = BitReader(data)
+    reader.read(start_bit)
+    writer = BitWriter()
+    does_next_have_extra_bit = False
+    extra_flag = (1 << bits_step) - 1  # файловый флаг, что следующий блок на 1 бит больше стандартного
+    previous_window = None  # (int, bits) предыдущего блока шифротекста
+    pending_crypted_window = None  # последний блок при дешифровании, может быть перезаписан
+    verbose_print(f'{"№":<4}{"bin":^16}{"int":^16}{"cr_bin":^16}{"cr_int":^16}')
+    window_number = 0
+    crypted_blocks_count = 0
+    extra_flags_count = 0
+    rewritten_windows_count = 0
+    with instrumentation.stage('transform'):
+        while reader.remaining:  # до конца файла
+            if is_encrypt_mode and seek_index is not None and window_number % SEEK_INDEX_INTERVAL == 0:
+                seek_index.append(writer.position)
+            window_number += 1
+            extra_bit = 0
+            if is_decrypt_mode and does_next_have_extra_bit:
+                extra_bit = 1
+
+            window_position = reader.position
+            window_int, window_bits = reader.read(bits_step + extra_bit)
+            if all((
+                    is_decrypt_mode,
+                    window_position >= reader.bits_count - bits_step,
+                    window_bits < bits_step,
+                    previous_window,
+            )):
+                previous_window_int, previous_window_bits = previous_window
+                if verbose:
+                    verbose_print(f'{"REWRITE PREVIOUS WINDOW " + "{:0>{}b}".format(*previous_window):^68}')
+                true_last_window_int = previous_window_int + window_int
+                true_last_crypted_window_int = crypt_block(true_last_window_int)
+                if verbose:
+                    true_last_crypted_window = '{:0>{}b}'.format(true_last_crypted_window_int, bits_step)
+                    verbose_print(
+                        f'{window_number-1:<4}{"":^16}{true_last_window_int:^16}{true_last_crypted_window:^16}'
+                        f'{true_last_crypted_window_int:^16} '
+                    )
+                pending_crypted_window = true_last_crypted_window_int
+                rewritten_windows_count += 1
+                break
+
+            if is_decrypt_mode and does_next_have_extra_bit:
+                does_next_have_extra_bit = False
+
+            if is_decrypt_mode and window_bits == bits_step and window_int == extra_flag:
+                if verbose:
+                    verbose_print('\tEXTRA_FLAG: пропуск блока, длина следующего будет на 1 больше стандартного.')
+                does_next_have_extra_bit = True
+                extra_flags_count += 1
+                continue
+
+            crypted_window_int = crypt_block(window_int)
+            if is_encrypt_mode and crypted_window_int > extra_flag:
+                writer.write(extra_flag, bits_step)
+                extra_flags_count += 1
+                if verbose:
+                    verbose_print('\t+ EXTRA_FLAG for next block')
+
+            if verbose:
+                window = '{:0>{}b}'.format(window_int, window_bits)
+                crypted_window = '{:0>{}b}'.format(crypted_window_int, bits_step)
+                verbose_print(
+                    f'{window_number:<4}{window:^16}{window_int:^16}{crypted_window:^16}{crypted_window_int:^16}'
+                )
+            previous_window = window_int, window_bits
+            if is_decrypt_mode:
+                if pending_crypted_window is not None:
+                    writer.write(pending_crypted_window, bits_step)
+                pending_crypted_window = crypted_window_int
+            else:
+                writer.write(crypted_window_int, bits_step)
+
+            crypted_blocks_count += 1
+            if crypted_blocks_count == blocks_limit:
+                break
+
+        if pending_crypted_window is not None:
+            writer.write(pending_crypted_window, bits_step)
+
+    instrumentation.count('blocks', crypted_blocks_count)
+    instrumentation.count('extra_flag_blocks', extra_flags_count)
+    instrumentation.count('rewritten_windows', rewritten_windows_count)
+    if seek_index is not None:
+        # Неполный последний байт выравнивается по правому краю (см. BitWriter.getvalue), смещения после начала
+        # этого байта в файле не совпадают с позициями в потоке, поэтому такие точки в индекс не попадают
+        seek_index[:] = [offset for offset in seek_index if offset <= writer.position // 8 * 8]
+    with instrumentation.stage('pack'):
+        return writer.getvalue()
+
+
+def get_seek_index_path(crypted_file):
+    """Путь до файла индекса произвольного доступа для зашифрованного файла"""
+    return f'{crypted_file}.idx'
+
+
+def get_seek_index_checksum(crypted_data):
+    """CRC32 первых и последних SEEK_INDEX_CHECK_SIZE байт шифротекста: проверка индекса не читает файл целиком"""
+    return zlib.crc32(crypted_data[-SEEK_INDEX_CHECK_SIZE:], zlib.crc32(crypted_data[:SEEK_INDEX_CHECK_SIZE]))
+
+
+def write_seek_index(index_path, bits_step, plaintext_size, seek_index, crypted_data):
+    """Запись индекса: заголовок (сигнатура, версия, длина блока, интервал, размер открытого текста, количество точек,
+    размер шифротекста crypted_data и его контрольная сумма, см. get_seek_index_checksum) и битовые смещения
+    шифротекста для блоков с номерами 0, SEEK_INDEX_INTERVAL, 2 * SEEK_INDEX_INTERVAL, ..."""
+    with open(index_path, 'wb') as index_file:
+        index_file.write(struct.pack(
+            SEEK_INDEX_HEADER_FORMAT,
+            SEEK_INDEX_SIGNATURE,
+            SEEK_INDEX_VERSION,
+            bits_step,
+            SEEK_INDEX_INTERVAL,
+            plaintext_size,
+            len(seek_index),
+            len(crypted_data),
+            get_seek_index_checksum(crypted_data),
+        ))
+        index_file.write(struct.pack(f'>{len(seek_index)}Q', *seek_index))
+
+
+def read_seek_index(index_path, crypted_data):
+    """Чтение индекса, возвращает (длина блока, интервал, размер открытого текста, смещения).
+    Индекс проверяется по размеру и контрольной сумме начала и конца шифротекста crypted_data: индекс от другого
+    файла (например, оставшийся после перезаписи шифротекста) дал бы неверные смещения и мусор вместо данных"""
+    with open(index_path, 'rb') as index_file:
+        header = index_file.read(struct.calcsize(SEEK_INDEX_HEADER_FORMAT))
+        if len(header) != struct.calcsize(SEEK_INDEX_HEADER_FORMAT):
+            raise ValueError(f'Файл {index_path} не является индексом EBC')
+        (signature, version, bits_step, interval, plaintext_size, offsets_count, crypted_size,
+         crypted_crc) = struct.unpack(SEEK_INDEX_HEADER_FORMAT, header)
+        if signature != SEEK_INDEX_SIGNATURE or version != SEEK_INDEX_VERSION:
+            raise ValueError(f'Файл {index_path} не является индексом EBC')
+        if crypted_size != len(crypted_data) or crypted_crc != get_seek_index_checksum(crypted_data):
+            raise ValueError(f'Индекс {index_path} не соответствует зашифрованному файлу')
+        seek_index = struct.unpack(f'>{offsets_count}Q', index_file.read(8 * offsets_count))
+
+    return bits_step, interval, plaintext_size, seek_index
+
+
+def decrypt_segments(data, crypt_block, bits_step, interval, seek_index, first_segment, last_segment):
+    """Дешифрование сегментов с номерами first_segment..last_segment включительно (сегмент - interval блоков
+    открытого текста, начиная с точки индекса), последний сегмент файла дешифруется до конца"""
+    start_bit = seek_index[first_segment]
+    blocks_limit = None
+    if last_segment < len(seek_index) - 1:
+        blocks_limit = (last_segment - first_segment + 1) * interval
+
+    return crypt_blocks(
+        memoryview(data)[start_bit // 8:],
+        crypt_block,
+        bits_step,
+        DECRYPT_MODE,
+        start_bit=start_bit % 8,
+        blocks_limit=blocks_limit,
+    )
+
+
+_worker_crypt_block = None  # функция преобразования блока в процессе пула, создаётся в _init_worker
+
+
+def _init_worker(key_var, key_base, codebook, codebook_dir, crt_components):
+    global _worker_crypt_block
+    _worker_crypt_block = get_block_crypter(key_var, key_base, codebook, codebook_dir, crt_components)
+
+
+def _decrypt_segments_in_worker(input_file, bits_step, interval, seek_index, first_segment, last_segment):
+    with map_input_file(input_file) as input_data:
+        return decrypt_segments(
+            input_data,
+            _worker_crypt_block,
+            bits_step,
+            interval,
+            seek_index,
+            first_segment,
+            last_segment,
+        )
+
+
+def decrypt_parallel(input_file, index_data, jobs, key_var, key_base, codebook=False, codebook_dir=CODEBOOK_CACHE_DIR,
+                     crt_components=None):
+    """Дешифрование всего файла по индексу index_data (результат read_seek_index для input_file): сегменты делятся
+    на jobs непрерывных групп, группы дешифруются в пуле процессов и объединяются по порядку"""
+    bits_step, interval, _, seek_index = index_data
+    segments_count = len(seek_index)
+    group_size = -(-segments_count // jobs)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(key_var, key_base, codebook, codebook_dir, crt_components),
+    ) as executor:
+        decrypted_groups = [
+            executor.submit(
+                _decrypt_segments_in_worker,
+                input_file,
+                bits_step,
+                interval,
+                seek_index,
+                first_segment,
+                min(first_segment + group_size, segments_count) - 1,
+            )
+            for first_segment in range(0, segments_count, group_size)
+        ]
+        return b''.join(decrypted_group.result() for decrypted_group in decrypted_groups)
+
+
+def decrypt_range(input_file, start, end, key=None, key_path=None, index_path=None, codebook=False,
+                  codebook_dir=CODEBOOK_CACHE_DIR):
+    """Дешифрование байтов открытого текста [start, end) с помощью индекса: дешифруются только сегменты,
+    пересекающиеся с диапазоном, а не весь файл от начала"""
+    key_var, key_base, *crt_components = get_key_components(key, key_path, False)
+    crypt_block = get_block_crypter(key_var, key_base, codebook, codebook_dir, crt_components)
+    with map_input_file(input_file) as input_data:
+        bits_step, interval, plaintext_size, seek_index = read_seek_index(
+            index_path or get_seek_index_path(input_file),
+            input_data,
+        )
+        end = min(end, plaintext_size)
+        if start >= end:
+            return b''
+
+        segment_size = interval * bits_step // 8
+        first_segment = min(start // segment_size, len(seek_index) - 1)
+        last_segment = min((end - 1) // segment_size, len(seek_index) - 1)
+        decrypted_data = decrypt_segments(
+            input_data,
+            crypt_block,
+            bits_step,
+            interval,
+            seek_index,
+            first_segment,
+            last_segment,
+        )
+
+    segment_start = first_segment * segment_size
+    return decrypted_data[start - segment_start:end - segment_start]
+
+
+def crypt(input_file: str, mode=ENCRYPT_MODE, output_file=None, key=None, key_path=None, verbose=False,
+          codebook=False, codebook_dir=CODEBOOK_CACHE_DIR, use_mmap=False, seek_index=False, jobs=1,
+          instrumentation=None, block_cache=None):
+    """Главный метод модуля.
+    instrumentation - объект Instrumentation для сбора времени этапов, счётчиков и профиля (по умолчанию выключен).
+    block_cache - объект BlockCache: результаты блоков кэшируются на время вызова, статистика остаётся в объекте
+    (при параллельном дешифровании по индексу процессы пула работают без кэша)"""
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
     is_encrypt_mode = mode == ENCRYPT_MODE
     is_decrypt_mode = mode == DECRYPT_MODE
     verbose_print = VerbosePrint(verbose)
     verbose_print(f'{"Шифрование" if is_encrypt_mode else "Дешифрование"} файла {input_file}')
     verbose_print('режим вывода процесса в консоль')
 
-    key_var, key_base = get_key_components(key, key_path, is_encrypt_mode)
+    key_var, key_base, *crt_components = get_key_components(key, key_path, is_encrypt_mode)
     verbose_print(f'{"Публичный ключ" if is_encrypt_mode else "Приватный ключ"}: ({key_var}, {key_base})')
-    bits_step = int(math.log2(key_base))
+    if codebook:
+        verbose_print(f'Загрузка кодовой книги для ключа ({key_var}, {key_base})')
+    if crt_components and not codebook:
+        verbose_print('Расширенный приватный ключ: дешифрование по китайской теореме об остатках')
+    crypt_block = get_block_crypter(key_var, key_base, codebook, codebook_dir, crt_components)
+    if block_cache is not None:
+        crypt_block = block_cache.wrap(crypt_block, key_base)
+        verbose_print(f'Кэш блоков: до {block_cache.max_entries} записей')
+    bits_step = key_base.bit_length() - 1  # int(math.log2(key_base)) без погрешности float
     verbose_print(f'Длина блока шифрования = {bits_step} бит(а)')
-    with open(input_file, 'rb') as input_file_bytes:
-        bytes_file_data = b''.join(input_file_bytes.readlines())
-        if not bytes_file_data:
-            raise ValueError('No data to encrypt/decrypt')
-
-        binary_view = bytes_to_binary_view(bytes_file_data)
+    input_file_size = os.path.getsize(input_file)
+    if not input_file_size:
+        raise ValueError('No data to encrypt/decrypt')
 
-    does_next_have_extra_bit = False
-    extra_flag = '1' * bits_step  # файловый флаг, что следующий блок на 1 бит больше стандартного
-    margin = 0  # количество смещений из-за экстра блоков
-    previous_window = ''
-    crypted_windows = []
-    verbose_print(f'{"№":<4}{"bin":^16}{"int":^16}{"cr_bin":^16}{"cr_int":^16}')
-    for window_number, window_start in enumerate(range(0, len(binary_view), bits_step), start=1):
-        extra_bit = 0
-        if is_decrypt_mode and does_next_have_extra_bit:
-            extra_bit = 1
-
-        window = binary_view[window_start + margin:window_start + bits_step + margin + extra_bit]
-        if window == '':  # конец файла
-            break
-
-        if all((
-                is_decrypt_mode,
-                window_start + margin >= len(binary_view) - bits_step,
-                len(window) < bits_step,
-                previous_window,
-        )):
-            verbose_print(f'{"REWRITE PREVIOUS WINDOW " + previous_window:^68}')
-            crypted_windows.pop()
-            previous_window_int = int(previous_window, base=2)
-            window_int = int(window, base=2)
-            true_last_window_int = previous_window_int + window_int
-            true_last_crypted_window_int = (true_last_window_int ** key_var) % key_base
-            true_last_crypted_window = '{{:0>{}b}}'.format(bits_step).format(true_last_crypted_window_int)
-            verbose_print(
-                f'{window_number-1:<4}{"":^16}{true_last_window_int:^16}{true_last_crypted_window:^16}'
-                f'{true_last_crypted_window_int:^16} '
+    seek_index_offsets = [] if is_encrypt_mode and seek_index else None
+    seek_index_path = get_seek_index_path(input_file)
+    index_data = None
+    if is_decrypt_mode and jobs > 1 and os.path.isfile(seek_index_path):
+        try:
+            with map_input_file(input_file) as input_data:
+                index_data = read_seek_index(seek_index_path, input_data)
+        except ValueError as error:
+            verbose_print(f'{error}, дешифрование без индекса')
+    with instrumentation:
+        if index_data is not None:
+            verbose_print(f'Параллельное дешифрование в {jobs} процессах по индексу {seek_index_path}')
+            with instrumentation.stage('transform'):
+                crypted_data = decrypt_parallel(input_file, index_data, jobs, key_var, key_base, codebook,
+                                                codebook_dir, crt_components)
+        elif use_mmap:
+            with map_input_file(input_file) as input_data:
+                crypted_data = crypt_blocks(input_data, crypt_block, bits_step, mode, verbose_print,
+                                            seek_index_offsets, instrumentation=instrumentation)
+        else:
+            with open(input_file, 'rb') as input_file_bytes, instrumentation.stage('read'):
+                input_data = input_file_bytes.read()
+            crypted_data = crypt_blocks(
+                input_data,
+                crypt_block,
+                bits_step,
+                mode,
+                verbose_print,
+                seek_index_offsets,
+                instrumentation=instrumentation,
             )
-            crypted_windows.append(true_last_crypted_window)
-            break
-
-        if is_decrypt_mode and does_next_have_extra_bit:
-            does_next_have_extra_bit = False
-            margin += 1
-
-        if is_decrypt_mode and window == extra_flag:
-            verbose_print('\tEXTRA_FLAG: пропуск блока, длина следующего будет на 1 больше стандартного.')
-            does_next_have_extra_bit = True
-            continue
-
-        window_int = int(window, base=2)
-        crypted_window_int = (window_int ** key_var) % key_base
-        crypted_window = '{{:0>{}b}}'.format(bits_step).format(crypted_window_int)
-        if is_encrypt_mode and len(crypted_window) > bits_step:
-            crypted_windows.append(extra_flag)
-            verbose_print('\t+ EXTRA_FLAG for next block')
-
-        verbose_print(f'{window_number:<4}{window:^16}{window_int:^16}{crypted_window:^16}{crypted_window_int:^16}')
-        previous_window = window
-        crypted_windows.append(crypted_window)
-
-    crypted_binary_view = ''.join(crypted_windows)
-    crypted_blocks = []
-    for crypted_block_start in range(0, len(crypted_binary_view), 8):
-        window = crypted_binary_view[crypted_block_start:crypted_block_start + 8]
-        window_int = int(window, base=2)
-        crypted_blocks.append(window_int.to_bytes(1, byteorder='big'))
+    instrumentation.count('bytes_read', input_file_size)
+    instrumentation.count('bytes_written', len(crypted_data))
+    if block_cache is not None:
+        instrumentation.count('block_cache_hits', block_cache.hits)
+        instrumentation.count('block_cache_misses', block_cache.misses)
+        verbose_print(block_cache.report())
 
     if not output_file:
         if is_decrypt_mode and '.enc' in input_file:
@@ -124,8 +377,16 @@ def crypt(input_file: str, mode=ENCRYPT_MODE, output_file=None, key=None, key_pa
         else:
             output_file = f'{input_file}.enc' if is_encrypt_mode else f'{input_file}.dec'
 
-    with open(output_file, 'wb') as decrypted_file:
-        decrypted_file.write(b''.join(crypted_blocks))
+    with open(output_file, 'wb') as decrypted_file, instrumentation.stage('write'):
+        decrypted_file.write(crypted_data)
+
+    if seek_index_offsets is not None:
+        verbose_print(f'Запись индекса ({len(seek_index_offsets)} точек) в файл {get_seek_index_path(output_file)}')
+        write_seek_index(get_seek_index_path(output_file), bits_step, input_file_size, seek_index_offsets, crypted_data)
+    elif is_encrypt_mode and os.path.isfile(get_seek_index_path(output_file)):
+        # индекс от прежнего содержимого выходного файла не подходит к новому шифротексту
+        verbose_print(f'Удаление устаревшего индекса {get_seek_index_path(output_file)}')
+        os.remove(get_seek_index_path(output_file))
 
 
 if __name__ == '__main__':
@@ -151,6 +412,10 @@ if __name__ == '__main__':
     
     Пример использования скрипта для дешифрования файла:
     python rsacrypt.py enc_test.txt -dv -k 749 893
+
+    Пример шифрования с индексом enc_test.txt.idx и дешифрования байтов [1000, 2000) без обработки всего файла:
+    python rsacrypt.py test.txt -o enc_test.txt -k 17 3233 -i
+    python rsacrypt.py enc_test.txt -d -k 2753 3233 -r 1000 2000 -o part.txt
         '''
     )
     command_line_parser.add_argument(
@@ -171,12 +436,97 @@ if __name__ == '__main__':
         help='Ключ (ввод в консоль двух чисел)',
     )
     command_line_parser.add_argument('-v', '--verbose', help='Вывод процесса в консоль', action='store_true')
-    arguments = command_line_parser.parse_args()
-    crypt(
-        arguments.input_file,
-        mode=DECRYPT_MODE if arguments.decrypt else ENCRYPT_MODE,
-        output_file=arguments.output_file,
-        key=arguments.key,
-        key_path=arguments.key_path,
-        verbose=arguments.verbose,
+    command_line_parser.add_argument(
+        '-c',
+        '--codebook',
+        help='Преобразование блоков через кодовую книгу (таблицу всех блоков), только для n <= 65536',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '-m',
+        '--mmap',
+        help='Чтение входного файла через отображение в память (mmap)',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '-i',
+        '--seek_index',
+        help='Запись индекса произвольного доступа <ВЫХОДНОЙ ФАЙЛ>.idx при шифровании',
+        action='store_true',
     )
+    command_line_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help='Количество процессов для дешифрования по индексу (по умолчанию 1)',
+    )
+    command_line_parser.add_argument(
+        '-r',
+        '--range',
+        type=int,
+        nargs=2,
+        metavar=('START', 'END'),
+        help='Дешифровать только байты открытого текста [START, END) по индексу',
+    )
+    command_line_parser.add_argument(
+        '-s',
+        '--stats',
+        help='Вывод времени этапов (read, transform, pack, write) и счётчиков блоков после преобразования',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '--profile',
+        type=str,
+        nargs='?',
+        const='',
+        help='Профилирование cProfile: без значения - вывод в консоль, со значением - сохранение профиля в файл',
+    )
+    command_line_parser.add_argument(
+        '--block_cache',
+        type=int,
+        nargs='?',
+        const=DEFAULT_BLOCK_CACHE_MEMORY // 2 ** 20,
+        metavar='MB',
+        help=f'LRU-кэш результатов блоков для повторяющихся данных, с ограничением памяти в МБ '
+             f'(по умолчанию {DEFAULT_BLOCK_CACHE_MEMORY // 2 ** 20}); статистика выводится в режиме -v',
+    )
+    command_line_parser.add_argument(
+        '--codebook_dir',
+        type=str,
+        default=CODEBOOK_CACHE_DIR,
+        help=f'Директория кэша кодовых книг (по умолчанию {CODEBOOK_CACHE_DIR})',
+    )
+    arguments = command_line_parser.parse_args()
+    if arguments.range:
+        decrypted_range = decrypt_range(
+            arguments.input_file,
+            *arguments.range,
+            key=arguments.key,
+            key_path=arguments.key_path,
+            codebook=arguments.codebook,
+            codebook_dir=arguments.codebook_dir,
+        )
+        with open(arguments.output_file or f'{arguments.input_file}.range', 'wb') as range_file:
+            range_file.write(decrypted_range)
+    else:
+        crypt_instrumentation = Instrumentation(arguments.stats, arguments.profile is not None)
+        crypt(
+            arguments.input_file,
+            mode=DECRYPT_MODE if arguments.decrypt else ENCRYPT_MODE,
+            output_file=arguments.output_file,
+            key=arguments.key,
+            key_path=arguments.key_path,
+            verbose=arguments.verbose,
+            codebook=arguments.codebook,
+            codebook_dir=arguments.codebook_dir,
+            use_mmap=arguments.mmap,
+            seek_index=arguments.seek_index,
+            jobs=arguments.jobs,
+            instrumentation=crypt_instrumentation,
+            block_cache=BlockCache(arguments.block_cache * 2 ** 20) if arguments.block_cache else None,
+        )
+        if arguments.profile:
+            crypt_instrumentation.dump_profile(arguments.profile)
+        if crypt_instrumentation.enabled:
+            print(crypt_instrumentation.report())
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import numpy_backend  # noqa: E402
+import ursacrypt  # noqa: E402
+from blockcrypt import get_block_crypter  # noqa: E402
+from keygen import choose_public_exponent, find_d  # noqa: E402
+
+# (p, q): модули 3233, 67591 и 4292870399 - от 12 до 32 бит, последний - наибольший для uint64 в pow_mod
+PRIME_PAIRS = ((61, 53), (257, 263), (65521, 65519))
+LAYOUTS = (ursacrypt.LAYOUT_UNIFIED, ursacrypt.LAYOUT_DENSE)
+DATA_SIZE = 10007  # не кратно длине блока: проверяется и неполный последний блок
+CHUNK_SIZE = 1000  # несколько порций потокового чтения на буфер
+
+
+def get_key_pair(p, q):
+    euler_value = (p - 1) * (q - 1)
+    e = choose_public_exponent(euler_value)
+    return (e, p * q), (find_d(e, euler_value), p * q)
+
+
+def get_crypters(key):
+    key_var, key_base = key
+    crypt_block_array = numpy_backend.get_block_array_crypter(key_var, key_base)
+    assert crypt_block_array is not None
+    return get_block_crypter(key_var, key_base), crypt_block_array
+
+
+@pytest.fixture
+def data():
+    return random.Random(DATA_SIZE).randbytes(DATA_SIZE)
+
+
+def crypt_bytes_both_backends(data, key, mode, layout=None):
+    """Результаты crypt_bytes без NumPy и с NumPy"""
+    crypt_block, crypt_block_array = get_crypters(key)
+    return (
+        ursacrypt.crypt_bytes(data, crypt_block, key[1], mode, CHUNK_SIZE, layout=layout),
+        ursacrypt.crypt_bytes(data, crypt_block, key[1], mode, CHUNK_SIZE, crypt_block_array, layout),
+    )
+
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+@pytest.mark.parametrize('p, q', PRIME_PAIRS)
+def test_crypt_bytes_matches_python_backend(data, p, q, layout):
+    public_key, private_key = get_key_pair(p, q)
+    encrypted, numpy_encrypted = crypt_bytes_both_backends(data, public_key, ursacrypt.ENCRYPT_MODE, layout)
+    assert numpy_encrypted == encrypted
+
+    decrypted, numpy_decrypted = crypt_bytes_both_backends(encrypted, private_key, ursacrypt.DECRYPT_MODE)
+    assert numpy_decrypted == decrypted == data
+
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+@pytest.mark.parametrize('p, q', PRIME_PAIRS)
+def test_crypt_blocks_matches_python_backend(data, p, q, layout):
+    public_key, private_key = get_key_pair(p, q)
+    in_bits_step, out_bits_step = ursacrypt.get_block_geometry(public_key[1], layout)
+    crypt_block, crypt_block_array = get_crypters(public_key)
+    encrypted = ursacrypt.crypt_blocks(data, crypt_block, in_bits_step, out_bits_step)
+    assert ursacrypt.crypt_blocks(data, crypt_block, in_bits_step, out_bits_step,
+                                  crypt_block_array=crypt_block_array) == encrypted
+
+    crypt_block, crypt_block_array = get_crypters(private_key)
+    decrypted = ursacrypt.crypt_blocks(encrypted, crypt_block, out_bits_step, in_bits_step)
+    assert ursacrypt.crypt_blocks(encrypted, crypt_block, out_bits_step, in_bits_step,
+                                  crypt_block_array=crypt_block_array) == decrypted
@@ -1,10 +1,43 @@
 import argparse
-import math
-import sys
-import time
+import glob
+import io
+import itertools
+import mmap
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+
+import numpy_backend
+from bitstream import BitReader, BitWriter
+from blockcrypt import CODEBOOK_CACHE_DIR, DEFAULT_BLOCK_CACHE_MEMORY, BlockCache, get_block_crypter
+from container import DEFAULT_CONTAINER_CHUNK_SIZE, ContainerReader, ContainerWriter, is_container_file
+from instrumentation import NULL_INSTRUMENTATION, Instrumentation, ProgressReporter
+from mmapio import MappedOutput, map_input_file
 
 ENCRYPT_MODE = 'ENCRYPT_MODE'
 DECRYPT_MODE = 'DECRYPT_MODE'
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # размер порции потокового чтения, байт
+CHUNKS_PER_JOB = 4  # порций на процесс при параллельном преобразовании, чтобы процессы загружались равномерно
+MIN_PARALLEL_CHUNK_SIZE = 4 * 1024  # меньшие порции не окупают передачу в процесс пула, байт
+PYTHON_BACKEND = 'python'
+NUMPY_BACKEND = 'numpy'
+BUFFER_TYPES = (mmap.mmap, bytes, bytearray, memoryview)
+
+# Упаковка зашифрованных блоков: unified - блоки дополняются до целого числа байтов (исходный формат),
+# dense - блоки по n.bit_length() бит записываются вплотную, bytes - блоки из целых байтов для больших ключей.
+# Упаковка записывается в заголовок файла; файлы исходного формата без заголовка дешифруются только с явно
+# заданной упаковкой (см. read_header)
+LAYOUT_UNIFIED = 'unified'
+LAYOUT_DENSE = 'dense'
+LAYOUT_BYTES = 'bytes'
+LAYOUT_CODES = {LAYOUT_UNIFIED: 0, LAYOUT_DENSE: 1, LAYOUT_BYTES: 2}
+LARGE_KEY_BITS = 1024  # длина модуля, начиная с которой по умолчанию используется упаковка bytes
+# Заголовок: сигнатура, версия, код упаковки
+HEADER_SIGNATURE = b'uRSA'
+HEADER_VERSION = 1
+HEADER = struct.Struct('>4sBB')
 
 
 class VerbosePrint:
@@ -22,119 +55,852 @@ class VerbosePrint:
 
 
 def get_key_components(key, key_path, is_encrypt_mode):
-    """Получение пары (e, n) в режиме шифрования или (d, n) в режиме дешифрования"""
+    """Получение пары (e, n) в режиме шифрования или (d, n) в режиме дешифрования.
+    Расширенный приватный ключ 'd n p q dP dQ qInv' возвращается целиком: (d, n, p, q, dP, dQ, qInv)"""
     if key:
-        return key
+        return tuple(key)
 
     if not key_path:
         key_path = 'public.key' if is_encrypt_mode else 'private.key'
 
     with open(key_path, 'r') as public_key_file:
-        return map(int, public_key_file.readlines()[0].strip().split())
+        key_components = tuple(map(int, public_key_file.readlines()[0].strip().split()))
+
+    if len(key_components) not in (2, 7):
+        raise ValueError(f'Неверный формат ключа в файле {key_path}: ожидается "e n", "d n" или "d n p q dP dQ qInv"')
+    return key_components
+
+
+def get_block_geometry(key_base, layout=LAYOUT_UNIFIED):
+    """Вычисление длины блока шифрования (для изначальных данных) и блока кратности (для зашифрованных данных).
+    В плотной упаковке зашифрованный блок (число меньше n) занимает ровно n.bit_length() бит,
+    в упаковке bytes блок открытого текста - на байт меньше длины n в байтах, зашифрованный блок - длина n в байтах"""
+    if layout == LAYOUT_BYTES:
+        key_bytes_count = (key_base.bit_length() + 7) // 8
+        if key_bytes_count < 2:
+            raise ValueError(f'Упаковка bytes требует n >= 256, получено n = {key_base}')
+        return 8 * (key_bytes_count - 1), 8 * key_bytes_count
+
+    origin_bits_step = key_base.bit_length() - 1  # int(math.log2(key_base)) без погрешности float
+    if layout == LAYOUT_DENSE:
+        return origin_bits_step, key_base.bit_length()
+
+    unified_bits_step = origin_bits_step + 8 - (origin_bits_step % 8)
+    return origin_bits_step, unified_bits_step
+
+
+def get_default_layout(key_base):
+    """Упаковка по умолчанию: исходная, а для модулей от LARGE_KEY_BITS бит - bytes"""
+    return LAYOUT_BYTES if key_base.bit_length() >= LARGE_KEY_BITS else LAYOUT_UNIFIED
+
+
+def pack_header(layout=LAYOUT_UNIFIED):
+    """Заголовок зашифрованных данных: сигнатура, версия и код упаковки"""
+    return HEADER.pack(HEADER_SIGNATURE, HEADER_VERSION, LAYOUT_CODES[layout])
+
+
+def get_layout(data):
+    """Упаковка зашифрованных данных по заголовку в их первых байтах.
+    Данные без заголовка не распознаются по содержимому: шифротекст исходного формата может начинаться
+    с любых байтов, в том числе с сигнатуры, поэтому его упаковка задаётся явно (см. read_header)"""
+    if len(data) < HEADER.size or bytes(data[:len(HEADER_SIGNATURE)]) != HEADER_SIGNATURE:
+        raise ValueError('Нет заголовка uRSA: файл без заголовка (исходный формат) дешифруется с явно заданной '
+                         'упаковкой (--layout unified)')
+
+    _, version, layout_code = HEADER.unpack(bytes(data[:HEADER.size]))
+    layouts = {code: layout for layout, code in LAYOUT_CODES.items()}
+    if version != HEADER_VERSION or layout_code not in layouts:
+        raise ValueError(f'Неподдерживаемый заголовок uRSA: версия {version}, упаковка {layout_code} '
+                         f'(файл без заголовка дешифруется с явно заданной упаковкой --layout unified)')
+    return layouts[layout_code]
+
+
+def read_header(input_stream, layout=None):
+    """Чтение заголовка из буфера или потока, возвращает пару (упаковка, данные после заголовка).
+    Если упаковка layout задана явно, данные считаются записанными без заголовка (исходный формат)
+    и возвращаются целиком. Для буфера данные - срез memoryview"""
+    if layout is not None:
+        return layout, input_stream
+
+    if isinstance(input_stream, BUFFER_TYPES):
+        return get_layout(input_stream), memoryview(input_stream)[HEADER.size:]
+
+    return get_layout(input_stream.read(HEADER.size)), input_stream
+
+
+def get_trailer_size(key_base, layout=LAYOUT_UNIFIED):
+    """Длина окончания зашифрованных данных: длина последнего блока в unified_bits_step / 8 байтах
+    (в упаковке bytes - в 2 байтах), в плотной упаковке - и байт с количеством бит, дополняющих последний байт блоков"""
+    if layout == LAYOUT_BYTES:
+        return 2
+
+    return get_block_geometry(key_base)[1] // 8 + (layout == LAYOUT_DENSE)
+
+
+def pack_trailer(last_block_length_info, padding_bits, key_base, layout=LAYOUT_UNIFIED):
+    if layout == LAYOUT_BYTES:
+        return last_block_length_info.to_bytes(2, byteorder='big')
+
+    trailer = last_block_length_info.to_bytes(get_block_geometry(key_base)[1] // 8, byteorder='big')
+    return trailer + bytes([padding_bits]) if layout == LAYOUT_DENSE else trailer
+
+
+def unpack_trailer(trailer, key_base, layout=LAYOUT_UNIFIED):
+    """Разбор окончания, возвращает пару (длина последнего блока в битах, количество бит дополнения)"""
+    if layout == LAYOUT_BYTES:
+        return int.from_bytes(trailer, byteorder='big'), 0
+
+    unified_bytes_step = get_block_geometry(key_base)[1] // 8
+    last_block_length_info = int.from_bytes(trailer[:unified_bytes_step], byteorder='big')
+    return last_block_length_info, trailer[unified_bytes_step] if layout == LAYOUT_DENSE else 0
+
+
+def crypt_byte_blocks(data, crypt_block, in_bytes_step, out_bytes_step, last_block_bytes=None,
+                      instrumentation=NULL_INSTRUMENTATION):
+    """Преобразование блоков из целых байтов: срезы memoryview -> int.from_bytes -> crypt_block -> int.to_bytes,
+    без побитового разбора. Возвращает None, если результат блока не помещается в out_bytes_step байт
+    (неверный ключ) - тогда преобразование выполняется побитово, как в crypt_blocks"""
+    data = memoryview(data)
+    with instrumentation.stage('read'):
+        window_ints = [
+            int.from_bytes(data[start:start + in_bytes_step], byteorder='big')
+            for start in range(0, len(data), in_bytes_step)
+        ]
+    with instrumentation.stage('transform'):
+        crypted_window_ints = [crypt_block(window_int) for window_int in window_ints]
+    with instrumentation.stage('pack'):
+        try:
+            crypted_windows = [
+                crypted_window_int.to_bytes(out_bytes_step, byteorder='big')
+                for crypted_window_int in crypted_window_ints
+            ]
+            if last_block_bytes is not None and crypted_windows:
+                crypted_windows[-1] = crypted_window_ints[-1].to_bytes(last_block_bytes, byteorder='big')
+        except OverflowError:
+            return None
+        crypted_data = b''.join(crypted_windows)
+    instrumentation.count('blocks', len(window_ints))
+
+    return crypted_data
+
+
+def crypt_blocks(data, crypt_block, in_bits_step, out_bits_step, last_block_bits=None, trace=None,
+                 crypt_block_array=None, instrumentation=NULL_INSTRUMENTATION, data_bits=None, pad_right=False):
+    """Преобразование блоков по in_bits_step бит из data в блоки по out_bits_step бит.
+    Последний блок может быть короче in_bits_step; если задан last_block_bits, он записывается этой длиной.
+    data_bits - количество значащих бит data (по умолчанию все), pad_right - см. BitWriter.getvalue.
+
+    Если передана векторная функция crypt_block_array (см. numpy_backend), целые блоки преобразуются
+    массивом группами по 8 (чтобы граница оставалась на границе байта), остаток - поблочно.
+    Блоки разбираются, преобразуются и упаковываются тремя отдельными проходами (этапы read, transform, pack).
+    Блоки из целых байтов (упаковка bytes) преобразуются без побитового разбора, см. crypt_byte_blocks"""
+    bits_count = len(data) * 8 if data_bits is None else data_bits
+    if crypt_block_array is not None and trace is None:
+        bulk_blocks_count = bits_count // in_bits_step
+        if last_block_bits is not None and bulk_blocks_count * in_bits_step == bits_count:
+            bulk_blocks_count -= 1
+        bulk_blocks_count -= bulk_blocks_count % 8
+        if bulk_blocks_count:
+            bulk_bytes_count = bulk_blocks_count * in_bits_step // 8
+            with instrumentation.stage('read'):
+                blocks = numpy_backend.unpack_blocks(data[:bulk_bytes_count], in_bits_step)
+            with instrumentation.stage('transform'):
+                crypted_blocks = crypt_block_array(blocks)
+            if not (crypted_blocks >> out_bits_step).any():  # иначе блоки длиннее out_bits_step, см. BitWriter.write
+                with instrumentation.stage('pack'):
+                    crypted_data = numpy_backend.pack_blocks(crypted_blocks, out_bits_step)
+                instrumentation.count('numpy_blocks', bulk_blocks_count)
+                return crypted_data + crypt_blocks(
+                    memoryview(data)[bulk_bytes_count:],
+                    crypt_block,
+                    in_bits_step,
+                    out_bits_step,
+                    last_block_bits=last_block_bits,
+                    instrumentation=instrumentation,
+                    data_bits=bits_count - bulk_bytes_count * 8,
+                    pad_right=pad_right,
+                )
+
+    if (in_bits_step % 8 == 0 and out_bits_step % 8 == 0 and bits_count % 8 == 0 and trace is None
+            and (last_block_bits is None or last_block_bits % 8 == 0)):
+        crypted_data = crypt_byte_blocks(
+            memoryview(data)[:bits_count // 8],
+            crypt_block,
+            in_bits_step // 8,
+            out_bits_step // 8,
+            last_block_bits // 8 if last_block_bits is not None else None,
+            instrumentation,
+        )
+        if crypted_data is not None:
+            return crypted_data
+
+    with instrumentation.stage('read'):
+        reader = BitReader(data, bits_count)
+        blocks_count = -(-reader.remaining // in_bits_step)
+        windows = [reader.read(in_bits_step) for _ in range(blocks_count)]
+    with instrumentation.stage('transform'):
+        crypted_window_ints = [crypt_block(window_int) for window_int, _ in windows]
+    with instrumentation.stage('pack'):
+        crypted_bits = [out_bits_step] * blocks_count
+        if last_block_bits is not None and blocks_count:
+            crypted_bits[-1] = last_block_bits
+        writer = BitWriter()
+        for crypted_window_int, crypted_window_bits in zip(crypted_window_ints, crypted_bits):
+            writer.write(crypted_window_int, crypted_window_bits)
+        crypted_data = writer.getvalue(pad_right)
+    instrumentation.count('blocks', blocks_count)
+
+    if trace:
+        for block_number, (window_int, window_bits) in enumerate(windows):
+            is_last_block = last_block_bits is not None and block_number == blocks_count - 1
+            trace(window_int, window_bits, crypted_window_ints[block_number], crypted_bits[block_number], is_last_block)
+
+    return crypted_data
+
+
+def get_chunk_size(in_bits_step, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Размер порции чтения, кратный in_bits_step байтам: порция из 8 * k блоков переводится в целое число байтов"""
+    return max(1, chunk_size // in_bits_step) * in_bits_step
+
+
+def get_parallel_chunk_size(data_size, jobs, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Размер порции для преобразования в jobs процессах: данные делятся не меньше чем на CHUNKS_PER_JOB порций
+    на процесс, но не мельче MIN_PARALLEL_CHUNK_SIZE и не крупнее chunk_size байт.
+    Последняя порция преобразуется в основном процессе, поэтому она должна быть малой долей данных"""
+    return min(chunk_size, max(MIN_PARALLEL_CHUNK_SIZE, -(-data_size // (jobs * CHUNKS_PER_JOB))))
+
+
+def get_crypted_size(data_size, key_base, mode=ENCRYPT_MODE, last_block_length_info=None, layout=LAYOUT_UNIFIED,
+                     padding_bits=0, header_size=HEADER.size):
+    """Размер результата преобразования data_size байт, вычисляемый по геометрии блоков.
+    Для дешифрования нужны длина последнего блока и количество бит дополнения из конца зашифрованного файла
+    (см. unpack_trailer), data_size - вместе с заголовком (header_size байт, 0 - без заголовка) и окончанием"""
+    origin_bits_step, crypted_bits_step = get_block_geometry(key_base, layout)
+    service_size = header_size + get_trailer_size(key_base, layout)
+    if mode == ENCRYPT_MODE:
+        blocks_count = -(-data_size * 8 // origin_bits_step)
+        return service_size + -(-blocks_count * crypted_bits_step // 8)
+
+    blocks_count = ((data_size - service_size) * 8 - padding_bits) // crypted_bits_step
+    return max(0, -(-((blocks_count - 1) * origin_bits_step + last_block_length_info) // 8))
+
+
+def iter_chunks(input_stream, chunk_size, holdback=0, instrumentation=NULL_INSTRUMENTATION):
+    """Чтение потока порциями по chunk_size байт. Генерирует пары (порция, является ли порция последней).
+    Последняя порция всегда содержит не менее holdback последних байтов потока (если поток не короче).
+    Если вместо потока передан буфер (например, mmap), порции - срезы memoryview без копирования"""
+    if isinstance(input_stream, BUFFER_TYPES):
+        input_buffer = memoryview(input_stream)
+        position = 0
+        while len(input_buffer) - position > chunk_size + holdback:
+            yield input_buffer[position:position + chunk_size], False
+            position += chunk_size
+
+        yield input_buffer[position:], True
+        return
+
+    buffer = bytearray()
+    while True:
+        with instrumentation.stage('read'):
+            data = input_stream.read(chunk_size)
+        if not data:
+            break
+
+        buffer += data
+        while len(buffer) > chunk_size + holdback:
+            yield bytes(buffer[:chunk_size]), False
+            del buffer[:chunk_size]
+
+    yield bytes(buffer), True
+
+
+_worker_crypt_block = None  # функции преобразования блока в процессе пула, создаются в _init_worker
+_worker_crypt_block_array = None
+
+
+def _init_worker(key_var, key_base, codebook, codebook_dir, backend, crt_components):
+    global _worker_crypt_block, _worker_crypt_block_array
+    _worker_crypt_block = get_block_crypter(key_var, key_base, codebook, codebook_dir, crt_components)
+    if backend == NUMPY_BACKEND:
+        _worker_crypt_block_array = numpy_backend.get_block_array_crypter(key_var, key_base, codebook, codebook_dir)
+
+
+def _crypt_chunk_in_worker(chunk, in_bits_step, out_bits_step):
+    return crypt_blocks(
+        chunk,
+        _worker_crypt_block,
+        in_bits_step,
+        out_bits_step,
+        crypt_block_array=_worker_crypt_block_array,
+    )
+
+
+def create_process_pool(jobs, key_var, key_base, codebook=False, codebook_dir=CODEBOOK_CACHE_DIR,
+                        backend=PYTHON_BACKEND, crt_components=None):
+    """Пул процессов для параллельного преобразования порций, в каждом процессе создаётся своя функция
+    преобразования блока для ключа (key_var, key_base)"""
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(key_var, key_base, codebook, codebook_dir, backend, crt_components),
+    )
+
+
+def crypt_stream(input_stream, output_stream, crypt_block, key_base, mode=ENCRYPT_MODE, chunk_size=DEFAULT_CHUNK_SIZE,
+                 trace=None, progress=None, executor=None, crypt_block_array=None,
+                 instrumentation=NULL_INSTRUMENTATION, layout=None, jobs=None):
+    """Потоковое шифрование/дешифрование uRSA: данные читаются и записываются порциями из целых блоков,
+    поэтому расход памяти не зависит от размера файла. Возвращает длину последнего блока в битах.
+    Вместо input_stream можно передать буфер (mmap, bytes), см. iter_chunks.
+
+    Если передан executor (см. create_process_pool), порции кроме последней преобразуются в пуле процессов
+    и записываются в исходном порядке; trace в этом случае вызывается только для последней порции.
+    jobs - число процессов executor, по нему ограничивается число одновременно обрабатываемых порций
+    (по умолчанию - по числу ядер). Размер порций для пула см. get_parallel_chunk_size.
+    crypt_block_array - векторная функция преобразования блоков для NumPy-бэкенда (см. crypt_blocks).
+    instrumentation - сбор времени этапов и счётчиков (см. instrumentation.Instrumentation); при работе в пуле
+    ожидание результатов порций учитывается как этап transform.
+    layout - упаковка зашифрованных блоков: при шифровании по умолчанию см. get_default_layout, при дешифровании
+    по умолчанию читается из заголовка, а явно заданная упаковка означает данные без заголовка (исходный формат)"""
+    is_encrypt_mode = mode == ENCRYPT_MODE
+    header_size = HEADER.size if is_encrypt_mode or layout is None else 0
+    if is_encrypt_mode:
+        layout = layout or get_default_layout(key_base)
+    else:
+        layout, input_stream = read_header(input_stream, layout)
+    origin_bits_step, crypted_bits_step = get_block_geometry(key_base, layout)
+    in_bits_step, out_bits_step = origin_bits_step, crypted_bits_step
+    if not is_encrypt_mode:
+        in_bits_step, out_bits_step = crypted_bits_step, origin_bits_step
+
+    processed_bytes = 0 if is_encrypt_mode else header_size
+    read_bytes = 0
+    if is_encrypt_mode:
+        header = pack_header(layout)
+        output_stream.write(header)
+        instrumentation.count('bytes_written', len(header))
+
+    def write_chunk(crypted_chunk, chunk_length):
+        nonlocal processed_bytes
+        with instrumentation.stage('write'):
+            output_stream.write(crypted_chunk)
+        instrumentation.count('chunks')
+        instrumentation.count('bytes_written', len(crypted_chunk))
+        processed_bytes += chunk_length
+        if progress:
+            progress(processed_bytes)
+
+    # Порции кратны блоку и 8 битам одновременно, поэтому их можно преобразовывать независимо.
+    # Число одновременно обрабатываемых порций ограничено, чтобы память не росла с размером файла
+    pending_chunks = deque()
+    max_pending_chunks = 2 * (jobs or os.cpu_count() or 1)
+
+    # При дешифровании длина последнего блока записана в конце файла, её нужно придержать до последней порции
+    trailer_size = get_trailer_size(key_base, layout)
+    holdback = 0 if is_encrypt_mode else trailer_size
+    chunks = iter_chunks(input_stream, get_chunk_size(in_bits_step, chunk_size), holdback, instrumentation)
+    for chunk, is_last_chunk in chunks:
+        read_bytes += len(chunk)
+        instrumentation.count('bytes_read', len(chunk))
+        if not is_last_chunk:
+            if not executor:
+                crypted_chunk = crypt_blocks(
+                    chunk,
+                    crypt_block,
+                    in_bits_step,
+                    out_bits_step,
+                    trace=trace,
+                    crypt_block_array=crypt_block_array,
+                    instrumentation=instrumentation,
+                )
+                write_chunk(crypted_chunk, len(chunk))
+                continue
+
+            crypted_chunk = executor.submit(_crypt_chunk_in_worker, bytes(chunk), in_bits_step, out_bits_step)
+            pending_chunks.append((crypted_chunk, len(chunk)))
+            if len(pending_chunks) >= max_pending_chunks:
+                crypted_chunk, chunk_length = pending_chunks.popleft()
+                with instrumentation.stage('transform'):
+                    crypted_chunk = crypted_chunk.result()
+                write_chunk(crypted_chunk, chunk_length)
+            continue
+
+        while pending_chunks:
+            crypted_chunk, chunk_length = pending_chunks.popleft()
+            with instrumentation.stage('transform'):
+                crypted_chunk = crypted_chunk.result()
+            write_chunk(crypted_chunk, chunk_length)
+
+        if is_encrypt_mode:
+            if not read_bytes:
+                raise ValueError('No data to encrypt/decrypt')
+
+            last_block_length_info = (read_bytes * 8) % origin_bits_step or origin_bits_step
+            blocks_count = -(-read_bytes * 8 // origin_bits_step)
+            padding_bits = -blocks_count * out_bits_step % 8
+            crypted_chunk = crypt_blocks(
+                chunk,
+                crypt_block,
+                in_bits_step,
+                out_bits_step,
+                trace=trace,
+                crypt_block_array=crypt_block_array,
+                instrumentation=instrumentation,
+                pad_right=True,
+            )
+            crypted_chunk += pack_trailer(last_block_length_info, padding_bits, key_base, layout)
+            write_chunk(crypted_chunk, len(chunk))
+        else:
+            if len(chunk) <= trailer_size:
+                raise ValueError('No data to encrypt/decrypt')
+
+            last_block_length_info, padding_bits = unpack_trailer(chunk[-trailer_size:], key_base, layout)
+            crypted_chunk = crypt_blocks(
+                memoryview(chunk)[:-trailer_size],
+                crypt_block,
+                in_bits_step,
+                out_bits_step,
+                last_block_bits=last_block_length_info,
+                trace=trace,
+                crypt_block_array=crypt_block_array,
+                instrumentation=instrumentation,
+                data_bits=(len(chunk) - trailer_size) * 8 - padding_bits,
+            )
+            write_chunk(crypted_chunk, len(chunk))
+
+    return last_block_length_info
+
+
+def crypt_bytes(data, crypt_block, key_base, mode=ENCRYPT_MODE, chunk_size=DEFAULT_CHUNK_SIZE, crypt_block_array=None,
+                layout=None):
+    """Преобразование буфера целиком: результат - полный поток uRSA (при шифровании - с заголовком и длиной
+    последнего блока); layout - как в crypt_stream"""
+    crypted_data = io.BytesIO()
+    crypt_stream(data, crypted_data, crypt_block, key_base, mode, chunk_size, crypt_block_array=crypt_block_array,
+                 layout=layout)
+    return crypted_data.getvalue()
+
+
+def write_container(input_stream, output_stream, crypt_block, key_base,
+                    container_chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE, crypt_block_array=None, progress=None,
+                    layout=None):
+    """Шифрование потока в контейнер (см. container.py): каждые container_chunk_size байт открытого текста
+    шифруются в отдельный поток uRSA, который дешифруется независимо от остальных. Возвращает количество порций"""
+    container_writer = ContainerWriter(output_stream, container_chunk_size)
+    for chunk, _ in iter_chunks(input_stream, container_chunk_size):
+        crypted_chunk = crypt_bytes(chunk, crypt_block, key_base, ENCRYPT_MODE, crypt_block_array=crypt_block_array,
+                                    layout=layout)
+        container_writer.write_chunk(crypted_chunk, len(chunk))
+        if progress:
+            progress(container_writer.plaintext_size)
+    container_writer.close()
+    return container_writer.chunks_count
+
+
+def decrypt_container_chunks(container_reader, first_chunk, last_chunk, crypt_block, key_base, crypt_block_array=None):
+    """Дешифрование порций контейнера с номерами first_chunk..last_chunk включительно, генерирует открытый текст"""
+    for chunk_number in range(first_chunk, last_chunk + 1):
+        decrypted_chunk = crypt_bytes(
+            container_reader.get_chunk(chunk_number),
+            crypt_block,
+            key_base,
+            DECRYPT_MODE,
+            crypt_block_array=crypt_block_array,
+        )
+        if len(decrypted_chunk) != container_reader.index[chunk_number][2]:
+            raise ValueError(f'Длина порции {chunk_number} не совпадает с индексом: повреждённый контейнер')
+        yield decrypted_chunk
+
+
+def decrypt_container(input_data, output_stream, crypt_block, key_base, crypt_block_array=None, progress=None):
+    """Дешифрование контейнера из буфера input_data (bytes, mmap) целиком, возвращает количество порций"""
+    with ContainerReader(input_data) as container_reader:
+        decrypted_size = 0
+        chunks = decrypt_container_chunks(container_reader, 0, len(container_reader) - 1, crypt_block, key_base,
+                                          crypt_block_array)
+        for decrypted_chunk in chunks:
+            output_stream.write(decrypted_chunk)
+            decrypted_size += len(decrypted_chunk)
+            if progress:
+                progress(decrypted_size)
+        return len(container_reader)
+
+
+def decrypt_container_range(input_data, start, end, crypt_block, key_base, crypt_block_array=None):
+    """Дешифрование байтов открытого текста [start, end) контейнера: дешифруются только пересекающиеся порции"""
+    with ContainerReader(input_data) as container_reader:
+        end = min(end, container_reader.plaintext_size)
+        if start >= end:
+            return b''
+
+        first_chunk, last_chunk = container_reader.get_chunk_range(start, end)
+        chunks = decrypt_container_chunks(container_reader, first_chunk, last_chunk, crypt_block, key_base,
+                                          crypt_block_array)
+        decrypted_data = b''.join(chunks)
+        chunks_start = first_chunk * container_reader.chunk_size
+        return decrypted_data[start - chunks_start:end - chunks_start]
+
+
+def get_output_file(input_file, mode=ENCRYPT_MODE):
+    """Имя выходного файла по умолчанию: <ФАЙЛ>.enc при шифровании,
+    <ИМЯ>_decrypted.<РАСШИРЕНИЕ> (без .enc) или <ФАЙЛ>.dec при дешифровании.
+    .enc ищется только в имени файла, а не в пути до него (директория может называться, например, data.enc.d)"""
+    input_dir, input_name = os.path.split(input_file)
+    if mode == DECRYPT_MODE and '.enc' in input_name:
+        name, extension = os.path.splitext(input_name.replace('.enc', '', 1))
+        return os.path.join(input_dir, f'{name}_decrypted{extension}')
+
+    return f'{input_file}.enc' if mode == ENCRYPT_MODE else f'{input_file}.dec'
+
 
+def open_crypt_files(files_stack, input_file, output_file, key_base, mode=ENCRYPT_MODE, use_mmap=False,
+                     layout=None):
+    """Открытие входного и выходного файлов в files_stack (ExitStack), возвращает пару (вход, выход) для crypt_stream.
+    При use_mmap вход отображается в память, а выход выделяется заранее: его размер известен по геометрии блоков.
+    layout - как в crypt_stream"""
+    if not use_mmap:
+        return files_stack.enter_context(open(input_file, 'rb')), files_stack.enter_context(open(output_file, 'wb'))
 
-def bytes_to_binary_view(bytes_message):
-    """Функция для преобразования bytes-строки в бинарное представление"""
-    return ''.join(map(lambda x: '{:0>8b}'.format(x), bytes_message))
+    input_data = files_stack.enter_context(map_input_file(input_file))
+    last_block_length_info, padding_bits = None, 0
+    header_size = HEADER.size
+    if mode == ENCRYPT_MODE:
+        layout = layout or get_default_layout(key_base)
+    else:
+        header_size = HEADER.size if layout is None else 0
+        layout = layout or get_layout(input_data)
+        trailer = input_data[-get_trailer_size(key_base, layout):]
+        last_block_length_info, padding_bits = unpack_trailer(trailer, key_base, layout)
+    output_size = get_crypted_size(len(input_data), key_base, mode, last_block_length_info, layout, padding_bits,
+                                   header_size)
+    return input_data, files_stack.enter_context(MappedOutput(output_file, output_size))
+
+
+def crypt_container_file(input_file, output_file, crypt_block, key_base, mode=ENCRYPT_MODE,
+                         container_chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE, crypt_block_array=None, use_mmap=False,
+                         progress=None, layout=None):
+    """Шифрование файла в контейнер или дешифрование контейнера целиком, возвращает количество порций.
+    Дешифрование всегда читает вход через mmap: порции берутся по смещениям из индекса"""
+    with ExitStack() as files_stack:
+        crypted_file = files_stack.enter_context(open(output_file, 'wb'))
+        if mode == DECRYPT_MODE:
+            input_data = files_stack.enter_context(map_input_file(input_file))
+            return decrypt_container(input_data, crypted_file, crypt_block, key_base, crypt_block_array, progress)
+
+        input_stream = files_stack.enter_context(map_input_file(input_file) if use_mmap else open(input_file, 'rb'))
+        return write_container(input_stream, crypted_file, crypt_block, key_base, container_chunk_size,
+                               crypt_block_array, progress, layout)
+
+
+class Cipher:
+    """Шифр uRSA, построенный один раз для пары ключей: ключи разбираются, функции преобразования блоков
+    (кодовая книга, CRT, NumPy) создаются при создании объекта, после чего объект обрабатывает любое количество
+    файлов и буферов без повторной подготовки. Методы не меняют состояние объекта, поэтому один Cipher
+    можно использовать из нескольких потоков.
+
+    public_key - (e, n) для шифрования, private_key - (d, n) или (d, n, p, q, dP, dQ, qInv) для дешифрования;
+    достаточно ключа только для нужного направления; layout - упаковка зашифрованных блоков при шифровании
+    (по умолчанию см. get_default_layout). При дешифровании упаковка читается из заголовка; параметр layout
+    методов задаёт её для данных без заголовка (исходный формат)"""
+
+    def __init__(self, public_key=None, private_key=None, codebook=False, codebook_dir=CODEBOOK_CACHE_DIR,
+                 chunk_size=DEFAULT_CHUNK_SIZE, backend=PYTHON_BACKEND, layout=None):
+        if public_key is None and private_key is None:
+            raise ValueError('Для шифра нужен хотя бы один ключ')
+
+        self.chunk_size = chunk_size
+        self.layout = layout or (get_default_layout(public_key[1]) if public_key else None)
+        self._crypters = {}
+        for mode, key in ((ENCRYPT_MODE, public_key), (DECRYPT_MODE, private_key)):
+            if key is None:
+                continue
+            key_var, key_base, *crt_components = key
+            crypt_block_array = None
+            if backend == NUMPY_BACKEND:
+                crypt_block_array = numpy_backend.get_block_array_crypter(key_var, key_base, codebook, codebook_dir)
+            crypt_block = get_block_crypter(key_var, key_base, codebook, codebook_dir, crt_components)
+            self._crypters[mode] = crypt_block, key_base, crypt_block_array
+
+    @classmethod
+    def from_key_files(cls, public_key_path=None, private_key_path=None, **options):
+        """Создание шифра по файлам ключей в формате keygen.py (public.key, private.key)"""
+        return cls(
+            get_key_components(None, public_key_path, True) if public_key_path else None,
+            get_key_components(None, private_key_path, False) if private_key_path else None,
+            **options,
+        )
+
+    def _get_crypter(self, mode):
+        if mode not in self._crypters:
+            raise ValueError(f'Шифр создан без ключа для {"шифрования" if mode == ENCRYPT_MODE else "дешифрования"}')
+        return self._crypters[mode]
+
+    def _get_layout(self, mode, layout):
+        return layout or self.layout if mode == ENCRYPT_MODE else layout
+
+    def crypt_bytes(self, data, mode=ENCRYPT_MODE, layout=None):
+        crypt_block, key_base, crypt_block_array = self._get_crypter(mode)
+        return crypt_bytes(data, crypt_block, key_base, mode, self.chunk_size, crypt_block_array,
+                           self._get_layout(mode, layout))
+
+    def crypt_file(self, input_file, output_file=None, mode=ENCRYPT_MODE, use_mmap=False, container=False,
+                   container_chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE, layout=None):
+        """Преобразование файла, возвращает путь до выходного файла (по умолчанию см. get_output_file).
+        При container=True шифрование выполняется в контейнер, контейнер при дешифровании определяется сам"""
+        crypt_block, key_base, crypt_block_array = self._get_crypter(mode)
+        if not os.path.getsize(input_file):
+            raise ValueError('No data to encrypt/decrypt')
+
+        layout = self._get_layout(mode, layout)
+        output_file = output_file or get_output_file(input_file, mode)
+        if container if mode == ENCRYPT_MODE else is_container_file(input_file):
+            crypt_container_file(input_file, output_file, crypt_block, key_base, mode, container_chunk_size,
+                                 crypt_block_array, use_mmap, layout=layout)
+            return output_file
+
+        with ExitStack() as files_stack:
+            input_file_bytes, crypted_file = open_crypt_files(
+                files_stack,
+                input_file,
+                output_file,
+                key_base,
+                mode,
+                use_mmap,
+                layout,
+            )
+            crypt_stream(input_file_bytes, crypted_file, crypt_block, key_base, mode, self.chunk_size,
+                         crypt_block_array=crypt_block_array, layout=layout)
+        return output_file
+
+    def encrypt_bytes(self, data):
+        return self.crypt_bytes(data, ENCRYPT_MODE)
+
+    def decrypt_bytes(self, data, layout=None):
+        return self.crypt_bytes(data, DECRYPT_MODE, layout)
+
+    def encrypt_file(self, input_file, output_file=None, use_mmap=False, container=False,
+                     container_chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE):
+        return self.crypt_file(input_file, output_file, ENCRYPT_MODE, use_mmap, container, container_chunk_size)
+
+    def decrypt_file(self, input_file, output_file=None, use_mmap=False, layout=None):
+        return self.crypt_file(input_file, output_file, DECRYPT_MODE, use_mmap, layout=layout)
+
+    def decrypt_range(self, input_file, start, end):
+        """Дешифрование байтов открытого текста [start, end) из контейнера без дешифрования остальных порций"""
+        crypt_block, key_base, crypt_block_array = self._get_crypter(DECRYPT_MODE)
+        with map_input_file(input_file) as input_data:
+            return decrypt_container_range(input_data, start, end, crypt_block, key_base, crypt_block_array)
+
+
+def decrypt_range(input_file, start, end, key=None, key_path=None, codebook=False, codebook_dir=CODEBOOK_CACHE_DIR,
+                  backend=PYTHON_BACKEND):
+    """Дешифрование байтов открытого текста [start, end) из контейнера (см. crypt с container=True)"""
+    private_key = get_key_components(key, key_path, False)
+    cipher = Cipher(private_key=private_key, codebook=codebook, codebook_dir=codebook_dir, backend=backend)
+    return cipher.decrypt_range(input_file, start, end)
 
 
-def crypt(input_file, mode=ENCRYPT_MODE, output_file=None, key=None, key_path=None, verbose=False, progress_bar=False):
-    """Главный метод модуля"""
+def find_input_files(path_or_pattern, mode=ENCRYPT_MODE):
+    """Список файлов для пакетного режима: файлы директории (при шифровании - кроме *.enc, при дешифровании -
+    только *.enc) или все файлы, подходящие под шаблон glob"""
+    if os.path.isdir(path_or_pattern):
+        input_files = (
+            os.path.join(path_or_pattern, file_name)
+            for file_name in os.listdir(path_or_pattern)
+            if file_name.endswith('.enc') == (mode == DECRYPT_MODE)
+        )
+    else:
+        input_files = glob.iglob(path_or_pattern)
+
+    return sorted(input_file for input_file in input_files if os.path.isfile(input_file))
+
+
+def get_batch_output_files(input_files, mode=ENCRYPT_MODE, output_dir=None):
+    """Выходные файлы пакетного режима: имена как в get_output_file, а в output_dir сохраняются пути входных файлов
+    относительно их общей директории (g/a/x.txt и g/b/x.txt -> <output_dir>/a/x.txt.enc и <output_dir>/b/x.txt.enc).
+    Если два входных файла всё же получают один выходной (например, x.txt.enc и x.enc.txt при дешифровании),
+    возникает ValueError: иначе потоки пула записывали бы один файл одновременно"""
+    output_files = [get_output_file(input_file, mode) for input_file in input_files]
+    if output_dir and output_files:
+        input_dirs = [os.path.dirname(os.path.abspath(input_file)) for input_file in input_files]
+        common_dir = os.path.commonpath(input_dirs)
+        output_files = [
+            os.path.normpath(os.path.join(output_dir, os.path.relpath(input_dir, common_dir),
+                                          os.path.basename(output_file)))
+            for input_dir, output_file in zip(input_dirs, output_files)
+        ]
+
+    input_files_by_output = {}
+    for input_file, output_file in zip(input_files, output_files):
+        same_output_file = input_files_by_output.setdefault(os.path.abspath(output_file), input_file)
+        if same_output_file != input_file:
+            raise ValueError(f'Файлы {same_output_file} и {input_file} преобразуются в один файл {output_file}')
+    return output_files
+
+
+def crypt_files(cipher, input_files, mode=ENCRYPT_MODE, output_dir=None, threads=None, use_mmap=False,
+                verbose=False, container=False, container_chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE, layout=None):
+    """Пакетное преобразование файлов в пуле потоков с одним общим шифром cipher.
+    Выходные файлы называются как в get_batch_output_files и, если задана output_dir, кладутся в неё.
+    container, container_chunk_size, layout - как в Cipher.crypt_file.
+    Возвращает список путей до выходных файлов в порядке input_files"""
+    verbose_print = VerbosePrint(verbose)
+    input_files = list(input_files)
+    output_files = get_batch_output_files(input_files, mode, output_dir)
+    if output_dir:
+        for output_subdir in {os.path.dirname(output_file) for output_file in output_files} | {output_dir}:
+            os.makedirs(output_subdir, exist_ok=True)
+
+    def crypt_one_file(input_file, output_file):
+        cipher.crypt_file(input_file, output_file, mode, use_mmap, container, container_chunk_size, layout)
+        verbose_print(f'{input_file} -> {output_file}')
+        return output_file
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(crypt_one_file, input_files, output_files))
+
+
+def crypt(input_file, mode=ENCRYPT_MODE, output_file=None, key=None, key_path=None, verbose=False, progress_bar=False,
+          codebook=False, codebook_dir=CODEBOOK_CACHE_DIR, chunk_size=DEFAULT_CHUNK_SIZE, jobs=1,
+          backend=PYTHON_BACKEND, use_mmap=False, instrumentation=None, container=False,
+          container_chunk_size=DEFAULT_CONTAINER_CHUNK_SIZE, layout=None, block_cache=None):
+    """Главный метод модуля.
+    instrumentation - объект Instrumentation для сбора времени этапов, счётчиков и профиля (по умолчанию выключен).
+    container - шифрование в контейнер из независимых порций по container_chunk_size байт (см. container.py),
+    из которого можно дешифровать произвольный диапазон (decrypt_range); контейнер при дешифровании определяется сам.
+    layout - упаковка зашифрованных блоков: LAYOUT_UNIFIED (исходная), LAYOUT_DENSE (вплотную) или LAYOUT_BYTES
+    (целые байты, см. get_block_geometry), по умолчанию - по длине ключа (get_default_layout);
+    при дешифровании упаковка читается из заголовка, а заданная явно означает файл без заголовка (исходный формат).
+    block_cache - объект BlockCache: результаты блоков кэшируются на время вызова, статистика остаётся в объекте
+    (блоки, преобразуемые массивом NumPy или в процессах пула jobs, проходят мимо кэша)"""
+    instrumentation = instrumentation or NULL_INSTRUMENTATION
     is_encrypt_mode = mode == ENCRYPT_MODE
-    is_decrypt_mode = mode == DECRYPT_MODE
     verbose_print = VerbosePrint(verbose)
     verbose_print(f'{"Шифрование" if is_encrypt_mode else "Дешифрование"} файла {input_file}')
     verbose_print('режим вывода процесса в консоль')
 
     # Извлечение значений ключа
-    key_var, key_base = get_key_components(key, key_path, is_encrypt_mode)
+    key_var, key_base, *crt_components = get_key_components(key, key_path, is_encrypt_mode)
     verbose_print(f'{"Публичный ключ" if is_encrypt_mode else "Приватный ключ"}: ({key_var}, {key_base})')
+    if codebook:
+        verbose_print(f'Загрузка кодовой книги для ключа ({key_var}, {key_base})')
+    if crt_components and not codebook:
+        verbose_print('Расширенный приватный ключ: дешифрование по китайской теореме об остатках')
+    crypt_block = get_block_crypter(key_var, key_base, codebook, codebook_dir, crt_components)
+    if block_cache is not None:
+        crypt_block = block_cache.wrap(crypt_block, key_base)
+        verbose_print(f'Кэш блоков: до {block_cache.max_entries} записей')
+    crypt_block_array = None
+    if backend == NUMPY_BACKEND:
+        crypt_block_array = numpy_backend.get_block_array_crypter(key_var, key_base, codebook, codebook_dir)
+        if crypt_block_array is None:
+            verbose_print('NumPy недоступен для этого ключа, используется преобразование на Python')
 
-    # Вычисление длины блока шифрования (для изначальных данных) и блока кратности (для зашифрованных данных)
-    origin_bits_step = int(math.log2(key_base))
-    unified_bits_step = origin_bits_step + 8 - (origin_bits_step % 8)
-    mode_step = origin_bits_step if is_encrypt_mode else unified_bits_step
-    origin_bits_template = '{{:0>{}b}}'.format(origin_bits_step)
-    unified_bits_template = '{{:0>{}b}}'.format(unified_bits_step)
-    mode_template = unified_bits_template if is_encrypt_mode else origin_bits_template
-    verbose_print(f'Длина блока шифрования = {origin_bits_step} bits, длина блока кратности = {unified_bits_step} bits')
-
-    # Чтение входного файла и представление его в двоичном виде
-    binary_view = ''
-    with open(input_file, 'rb') as input_file_bytes:
-        bytes_file_data = b''.join(input_file_bytes.readlines())
-        if not bytes_file_data:
-            raise ValueError('No data to encrypt/decrypt')
+    def report_block_cache():
+        if block_cache is not None:
+            instrumentation.count('block_cache_hits', block_cache.hits)
+            instrumentation.count('block_cache_misses', block_cache.misses)
+            verbose_print(block_cache.report())
 
-        binary_view = bytes_to_binary_view(bytes_file_data)
+    input_file_size = os.path.getsize(input_file)
+    if not input_file_size:
+        raise ValueError('No data to encrypt/decrypt')
 
-    last_block_skip = 0
+    is_container = container if is_encrypt_mode else is_container_file(input_file)
     if is_encrypt_mode:
-        last_block_length_info = len(binary_view) % origin_bits_step
-        last_block_length_info = last_block_length_info if last_block_length_info else origin_bits_step
+        layout = stream_layout = layout or get_default_layout(key_base)
     else:
-        binary_view, last_block_length_info = binary_view[:-unified_bits_step], binary_view[-unified_bits_step:]
-        last_block_length_info = int(last_block_length_info, base=2)
-        last_block_skip = unified_bits_step
-        verbose_print(f'Чтение длины последнего блока: {last_block_length_info} bits')
+        stream_layout = layout  # None - упаковка из заголовка
+        if layout and is_container:
+            raise ValueError('Упаковка порций контейнера записана в их заголовках и при дешифровании не задаётся')
+        if layout:
+            verbose_print('Файл без заголовка (исходный формат), упаковка задана явно')
+        elif not is_container:
+            with open(input_file, 'rb') as input_file_bytes:
+                layout = get_layout(input_file_bytes.read(HEADER.size))
+    if layout:
+        origin_bits_step, crypted_bits_step = get_block_geometry(key_base, layout)
+        verbose_print(f'Упаковка блоков: {layout}')
+        verbose_print(f'Длина блока шифрования = {origin_bits_step} bits, '
+                      f'длина блока кратности = {crypted_bits_step} bits')
 
-    verbose_print('\nПреобразование блоков данных\n')
-    if verbose:
-        time.sleep(1.5)
+    output_file = output_file or get_output_file(input_file, mode)
+    if is_container:
+        verbose_print(f'{"Шифрование в контейнер" if is_encrypt_mode else "Дешифрование контейнера"}, '
+                      f'запись в файл {output_file}')
+        with instrumentation:
+            chunks_count = crypt_container_file(
+                input_file,
+                output_file,
+                crypt_block,
+                key_base,
+                mode,
+                container_chunk_size,
+                crypt_block_array,
+                use_mmap,
+                progress=ProgressReporter(input_file_size) if progress_bar and is_encrypt_mode else None,
+                layout=stream_layout,
+            )
+        instrumentation.count('container_chunks', chunks_count)
+        verbose_print(f'Порций в контейнере: {chunks_count}')
+        report_block_cache()
+        return
 
-    crypted_windows = []
+    verbose_print('\nПреобразование блоков данных\n')
     if not progress_bar:
         verbose_print(f'{"№":<4}{"bin":^32}{"int":^8}{"cr_bin":^32}{"cr_int":^8}')
 
-    for window_number, window_start in enumerate(range(0, len(binary_view) - last_block_skip, mode_step), start=1):
-        window = binary_view[window_start:window_start + mode_step]
-        if window == '':  # конец файла
-            break
+    window_numbers = itertools.count(1)
 
-        window_int = int(window, base=2)
-        crypted_window_int = (window_int ** key_var) % key_base
-        crypted_window = mode_template.format(crypted_window_int)
-        if progress_bar:
-            percent = window_start / len(binary_view)
-            progress_percent = f'{percent:2.2%}'
-            sys.stdout.write(f'\rProgress: {progress_percent}')
-            # sys.stdout.flush()
-        else:
-            verbose_print(f'{window_number:<4}{window:^32}{window_int:^8}{crypted_window:^32}{crypted_window_int:^8}')
-
-        crypted_windows.append(crypted_window)
-
-    if is_decrypt_mode:
-        last_window = binary_view[-unified_bits_step:]
-        last_window_int = int(last_window, base=2)
-        crypted_last_window_int = (last_window_int ** key_var) % key_base
-        crypted_last_window = '{{:0>{}b}}'.format(last_block_length_info).format(crypted_last_window_int)
-        if not progress_bar:
-            verbose_print(f'{"L":<4}{last_window:^32}{last_window_int:^8}{crypted_last_window:^32}'
-                          f'{crypted_last_window_int:^8}')
-        crypted_windows.append(crypted_last_window)
-
-    crypted_binary_view = ''.join(crypted_windows)
-    crypted_blocks = []
-    for crypted_block_start in range(0, len(crypted_binary_view), 8):
-        window = crypted_binary_view[crypted_block_start:crypted_block_start + 8]
-        window_int = int(window, base=2)
-        crypted_blocks.append(window_int.to_bytes(1, byteorder='big'))
+    def trace(window_int, window_bits, crypted_window_int, crypted_bits, is_last_block):
+        window_number = 'L' if is_last_block else next(window_numbers)
+        window = '{:0>{}b}'.format(window_int, window_bits)
+        crypted_window = '{:0>{}b}'.format(crypted_window_int, crypted_bits)
+        verbose_print(f'{window_number:<4}{window:^32}{window_int:^8}{crypted_window:^32}{crypted_window_int:^8}')
 
-    if is_encrypt_mode:
-        verbose_print(f'\nЗапись длины последнего блока: {last_block_length_info} bits')
-        crypted_blocks.append(last_block_length_info.to_bytes(unified_bits_step // 8, byteorder='big'))
+    executor = None
+    if jobs > 1:
+        verbose_print(f'Параллельное преобразование в {jobs} процессах (таблица выводится только для последней порции)')
+        executor = create_process_pool(jobs, key_var, key_base, codebook, codebook_dir, backend, crt_components)
+        chunk_size = get_parallel_chunk_size(input_file_size, jobs, chunk_size)
+        verbose_print(f'Размер порции: {chunk_size} байт')
 
-    if not output_file:
-        if is_decrypt_mode and '.enc' in input_file:
-            output_file = input_file.replace('.enc', '', 1)
-            output_file = f'{output_file[:output_file.rindex(".")]}_decrypted{output_file[output_file.rindex("."):]}'
-        else:
-            output_file = f'{input_file}.enc' if is_encrypt_mode else f'{input_file}.dec'
+    try:
+        with ExitStack() as files_stack:
+            input_file_bytes, crypted_file = open_crypt_files(
+                files_stack,
+                input_file,
+                output_file,
+                key_base,
+                mode,
+                use_mmap,
+                stream_layout,
+            )
+
+            verbose_print(f'Запись {"зашифрованных" if is_encrypt_mode else "дешифрованных"} данных '
+                          f'в файл {output_file}')
+            with instrumentation:
+                last_block_length_info = crypt_stream(
+                    input_file_bytes,
+                    crypted_file,
+                    crypt_block,
+                    key_base,
+                    mode=mode,
+                    chunk_size=chunk_size,
+                    trace=trace if verbose and not progress_bar else None,
+                    progress=ProgressReporter(input_file_size) if progress_bar else None,
+                    executor=executor,
+                    crypt_block_array=crypt_block_array,
+                    instrumentation=instrumentation,
+                    layout=stream_layout,
+                    jobs=jobs,
+                )
+    finally:
+        if executor:
+            executor.shutdown()
 
-    with open(output_file, 'wb') as decrypted_file:
-        verbose_print(f'\nЗапись {"зашифрованных" if is_encrypt_mode else "дешифрованных"} данных в файл {output_file}')
-        decrypted_file.write(b''.join(crypted_blocks))
+    verbose_print(f'\nДлина последнего блока: {last_block_length_info} bits')
+    report_block_cache()
 
 
 if __name__ == '__main__':
@@ -160,6 +926,30 @@ if __name__ == '__main__':
 
     Пример использования скрипта для дешифрования файла:
     python rsacrypt.py enc_test.txt -dv -k 749 893
+
+    Если вместо файла указана директория или шаблон (например, "data/*.txt"), файлы обрабатываются пакетно в пуле
+    потоков с одним общим ключом, а -o задаёт директорию для результатов (пути файлов относительно их общей
+    директории сохраняются: "logs/*/app.log" -> encrypted/<ДИРЕКТОРИЯ>/app.log.enc):
+    python ursacrypt.py data -o encrypted -k 17 3233 -t 8
+    python ursacrypt.py "encrypted/*.enc" -d -o decrypted -k 2753 3233
+    python ursacrypt.py "logs/*/app.log" -o encrypted -k 17 3233
+
+    Шифрование в контейнер из независимых порций и дешифрование только байтов [1000000, 1001000):
+    python ursacrypt.py app.log --container -k 17 3233
+    python ursacrypt.py app.log.enc -r 1000000 1001000 -o slice.log -k 2753 3233
+
+    Плотная упаковка: блоки по n.bit_length() бит без дополнения до байта (файл меньше, упаковка записывается
+    в заголовок и при дешифровании определяется сама):
+    python ursacrypt.py test.txt --layout dense -k 17 3233
+
+    Для ключей от 1024 бит (keygen.py --bits 2048) по умолчанию используется упаковка bytes: блоки из целых
+    байтов преобразуются без побитового разбора:
+    python ursacrypt.py data.bin -p public.key
+    python ursacrypt.py data.bin.enc -d -p private.key
+
+    Зашифрованный файл всегда начинается с заголовка uRSA с кодом упаковки. Файл без заголовка, зашифрованный
+    прежними версиями скрипта, дешифруется с явно заданной упаковкой:
+    python ursacrypt.py old.txt.enc -d --layout unified -k 2753 3233
         '''
     )
     command_line_parser.add_argument(
@@ -168,8 +958,17 @@ if __name__ == '__main__':
         help='Режим дешифрования файла (по умолчанию файл шифруется)',
         action='store_true',
     )
-    command_line_parser.add_argument('input_file', type=str, help='Путь до файла, который нужно шифровать/дешифровать')
-    command_line_parser.add_argument('-o', '--output_file', type=str, help='Имя преобразованного файла')
+    command_line_parser.add_argument(
+        'input_file',
+        type=str,
+        help='Путь до файла, который нужно шифровать/дешифровать, директория или шаблон glob',
+    )
+    command_line_parser.add_argument(
+        '-o',
+        '--output_file',
+        type=str,
+        help='Имя преобразованного файла (в пакетном режиме - директория результатов)',
+    )
     key_group = command_line_parser.add_mutually_exclusive_group()
     key_group.add_argument('-p', '--key_path', type=str, help='Путь до файла с ключом')
     key_group.add_argument(
@@ -180,18 +979,169 @@ if __name__ == '__main__':
         help='Ключ (ввод в консоль двух чисел)',
     )
     command_line_parser.add_argument('-v', '--verbose', help='Вывод процесса в консоль', action='store_true')
+    command_line_parser.add_argument(
+        '-c',
+        '--codebook',
+        help='Преобразование блоков через кодовую книгу (таблицу всех блоков), только для n <= 65536',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '--chunk_size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Размер порции потокового чтения в байтах (по умолчанию {DEFAULT_CHUNK_SIZE}); при -j - наибольший '
+             'размер порции, данные делятся на порции по числу процессов',
+    )
+    command_line_parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help='Количество процессов для параллельного преобразования (по умолчанию 1)',
+    )
+    command_line_parser.add_argument(
+        '--backend',
+        choices=(PYTHON_BACKEND, NUMPY_BACKEND),
+        default=PYTHON_BACKEND,
+        help='Реализация преобразования блоков: python или numpy (векторное, если установлен NumPy)',
+    )
+    command_line_parser.add_argument(
+        '-m',
+        '--mmap',
+        help='Чтение и запись файлов через отображение в память (mmap)',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '--codebook_dir',
+        type=str,
+        default=CODEBOOK_CACHE_DIR,
+        help=f'Директория кэша кодовых книг (по умолчанию {CODEBOOK_CACHE_DIR})',
+    )
     command_line_parser.add_argument('-b',
                                      '--progress_bar',
                                      help='Вывод прогресса шифрования/дешифрования в консоль (заменяет verbose)',
                                      action='store_true',
                                      )
-    arguments = command_line_parser.parse_args()
-    crypt(
-        arguments.input_file,
-        mode=DECRYPT_MODE if arguments.decrypt else ENCRYPT_MODE,
-        output_file=arguments.output_file,
-        key=arguments.key,
-        key_path=arguments.key_path,
-        verbose=arguments.verbose,
-        progress_bar=arguments.progress_bar,
+    command_line_parser.add_argument(
+        '-s',
+        '--stats',
+        help='Вывод времени этапов (read, transform, pack, write) и счётчиков блоков после преобразования',
+        action='store_true',
+    )
+    command_line_parser.add_argument(
+        '--profile',
+        type=str,
+        nargs='?',
+        const='',
+        help='Профилирование cProfile: без значения - вывод в консоль, со значением - сохранение профиля в файл',
+    )
+    command_line_parser.add_argument(
+        '--container',
+        help='Шифрование в контейнер из независимо дешифруемых порций с индексом (для дешифрования диапазонов)',
+        action='store_true',
     )
+    command_line_parser.add_argument(
+        '--container_chunk_size',
+        type=int,
+        default=DEFAULT_CONTAINER_CHUNK_SIZE,
+        help=f'Размер порции контейнера в байтах открытого текста (по умолчанию {DEFAULT_CONTAINER_CHUNK_SIZE})',
+    )
+    command_line_parser.add_argument(
+        '-r',
+        '--range',
+        type=int,
+        nargs=2,
+        metavar=('START', 'END'),
+        help='Дешифровать из контейнера только байты открытого текста [START, END)',
+    )
+    command_line_parser.add_argument(
+        '--layout',
+        choices=(LAYOUT_UNIFIED, LAYOUT_DENSE, LAYOUT_BYTES),
+        help=f'Упаковка зашифрованных блоков: unified (до целого байта), dense (вплотную) или bytes (целые байты); '
+             f'по умолчанию unified, для ключей от {LARGE_KEY_BITS} бит - bytes. При дешифровании упаковка читается '
+             f'из заголовка, а заданная явно означает файл без заголовка (unified - файлы прежних версий)',
+    )
+    command_line_parser.add_argument(
+        '--block_cache',
+        type=int,
+        nargs='?',
+        const=DEFAULT_BLOCK_CACHE_MEMORY // 2 ** 20,
+        metavar='MB',
+        help=f'LRU-кэш результатов блоков для повторяющихся данных, с ограничением памяти в МБ '
+             f'(по умолчанию {DEFAULT_BLOCK_CACHE_MEMORY // 2 ** 20}); статистика выводится в режиме -v',
+    )
+    command_line_parser.add_argument(
+        '-t',
+        '--threads',
+        type=int,
+        help='Количество потоков в пакетном режиме (по умолчанию - по числу ядер)',
+    )
+    arguments = command_line_parser.parse_args()
+    crypt_mode = DECRYPT_MODE if arguments.decrypt else ENCRYPT_MODE
+    crypt_instrumentation = Instrumentation(arguments.stats, arguments.profile is not None)
+    if arguments.range:
+        decrypted_range = decrypt_range(
+            arguments.input_file,
+            *arguments.range,
+            key=arguments.key,
+            key_path=arguments.key_path,
+            codebook=arguments.codebook,
+            codebook_dir=arguments.codebook_dir,
+            backend=arguments.backend,
+        )
+        with open(arguments.output_file or f'{arguments.input_file}.range', 'wb') as range_file:
+            range_file.write(decrypted_range)
+    elif os.path.isdir(arguments.input_file) or glob.has_magic(arguments.input_file):
+        if arguments.jobs > 1 or arguments.block_cache or arguments.progress_bar:
+            command_line_parser.error('опции -j, --block_cache и -b не поддерживаются в пакетном режиме '
+                                      '(файлы обрабатываются в пуле потоков, см. -t)')
+        batch_key = get_key_components(arguments.key, arguments.key_path, crypt_mode == ENCRYPT_MODE)
+        batch_cipher = Cipher(
+            batch_key if crypt_mode == ENCRYPT_MODE else None,
+            batch_key if crypt_mode == DECRYPT_MODE else None,
+            codebook=arguments.codebook,
+            codebook_dir=arguments.codebook_dir,
+            chunk_size=arguments.chunk_size,
+            backend=arguments.backend,
+            layout=arguments.layout,
+        )
+        batch_files = find_input_files(arguments.input_file, crypt_mode)
+        with crypt_instrumentation:
+            crypt_files(
+                batch_cipher,
+                batch_files,
+                crypt_mode,
+                output_dir=arguments.output_file,
+                threads=arguments.threads,
+                use_mmap=arguments.mmap,
+                verbose=arguments.verbose,
+                container=arguments.container,
+                container_chunk_size=arguments.container_chunk_size,
+                layout=arguments.layout,
+            )
+        crypt_instrumentation.count('files', len(batch_files))
+    else:
+        crypt(
+            arguments.input_file,
+            mode=crypt_mode,
+            output_file=arguments.output_file,
+            key=arguments.key,
+            key_path=arguments.key_path,
+            verbose=arguments.verbose,
+            progress_bar=arguments.progress_bar,
+            codebook=arguments.codebook,
+            codebook_dir=arguments.codebook_dir,
+            chunk_size=arguments.chunk_size,
+            jobs=arguments.jobs,
+            backend=arguments.backend,
+            use_mmap=arguments.mmap,
+            instrumentation=crypt_instrumentation,
+            container=arguments.container,
+            container_chunk_size=arguments.container_chunk_size,
+            layout=arguments.layout,
+            block_cache=BlockCache(arguments.block_cache * 2 ** 20) if arguments.block_cache else None,
+        )
+    if arguments.profile:
+        crypt_instrumentation.dump_profile(arguments.profile)
+    if crypt_instrumentation.enabled:
+        print(crypt_instrumentation.report())